@@ -532,20 +532,40 @@ elif page == "Relatórios":
             ["Resumo Geral", "Por Distribuidora", "Comparativo", "Histórico"]
         )
     with col2:
-        date_from = st.date_input("Data Inicial")
+        date_from = st.date_input("Data Inicial", value=pd.Timestamp.today().date() - pd.Timedelta(days=30))
     with col3:
         date_to = st.date_input("Data Final")
     
+    from src.csv_processors.analytics_processor import AnalyticsCSVProcessor
+    filter_options = AnalyticsCSVProcessor().get_report_filters()
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        selected_artists = st.multiselect("Artistas", filter_options['artists'], help="Vazio = todos")
+    with col2:
+        selected_dsps = st.multiselect("Plataformas", filter_options['dsps'], help="Vazio = todas")
+    with col3:
+        grain_label = st.selectbox("Agrupamento", ["Dia", "Semana", "Mês"])
+    grain = {"Dia": "day", "Semana": "week", "Mês": "month"}[grain_label]
+    
     # Botão de gerar relatório
     if st.button("Gerar Relatório", type="primary"):
         with st.spinner("Gerando relatório..."):
             try:
-                from src.csv_processors.analytics_processor import AnalyticsCSVProcessor
                 from src.database.models import init_database
                 
                 init_database()
                 processor = AnalyticsCSVProcessor()
-                summary = processor.get_analytics_summary("AllMark")
+                if date_from > date_to:
+                    summary = {'error': 'A data inicial deve ser anterior à data final.'}
+                else:
+                    summary = processor.get_analytics_report(
+                        start_date=date_from,
+                        end_date=date_to,
+                        artist_names=selected_artists or None,
+                        dsps=selected_dsps or None,
+                        grain=grain
+                    )
                 
                 if 'error' not in summary and summary.get('total_streams', 0) > 0:
                     st.success("Relatório gerado com sucesso!")
@@ -554,17 +574,29 @@ elif page == "Relatórios":
                     import plotly.express as px
                     import plotly.graph_objects as go
                     
+                    # Evolução no período: matriz período × DSP preenchida direto do SQL
+                    matrix = processor.get_timeseries_matrix(
+                        start_date=date_from,
+                        end_date=date_to,
+                        artist_names=selected_artists or None,
+                        dsps=selected_dsps or None,
+                        grain=grain
+                    )
+                    if not matrix.empty:
+                        fig_series = px.line(
+                            matrix,
+                            title=f"Streams por {grain_label} ({date_from:%d/%m/%Y} a {date_to:%d/%m/%Y})",
+                            labels={'period': 'Período', 'value': 'Streams', 'dsp': 'Plataforma'},
+                            template="plotly_white"
+                        )
+                        st.plotly_chart(fig_series, use_container_width=True)
+                    
                     # Prepara dados para o gráfico
                     if summary.get('dsps'):
-                        dsp_data = []
-                        for dsp, data in summary['dsps'].items():
-                            dsp_data.append({
-                                'DSP': dsp,
-                                'Streams': data['streams'],
-                                'Receita': data['revenue']
-                            })
-                        
-                        df = pd.DataFrame(dsp_data)
+                        df = pd.DataFrame.from_dict(summary['dsps'], orient='index')
+                        df = df.rename_axis('DSP').reset_index().rename(
+                            columns={'streams': 'Streams', 'revenue': 'Receita'}
+                        )[['DSP', 'Streams', 'Receita']]
                         
                         # Gráfico de barras profissional
                         fig = go.Figure(data=[
@@ -604,8 +636,10 @@ elif page == "Relatórios":
                         }), use_container_width=True)
                     else:
                         st.info("Importe dados de analytics primeiro para visualizar relatórios.")
+                elif 'error' in summary:
+                    st.error(f"Erro ao gerar relatório: {summary['error']}")
                 else:
-                    st.info("Nenhum dado disponível. Importe arquivos CSV primeiro.")
+                    st.info("Nenhum dado no período e filtros selecionados.")
                     
             except Exception as e:
                 st.error(f"Erro ao gerar relatório: {str(e)}")
@@ -636,7 +670,7 @@ elif page == "Importação de Dados":
                 st.info("""
                 **Estrutura do arquivo CSV:**
                 - Primeira coluna: `DSP` (nome da plataforma)
-                - Demais colunas: Datas no formato `DD mes` (ex: "8 set", "9 set")
+                - Demais colunas: Datas no formato `DD mes` (ex: "8 set", "9 set"), `Sep 8` ou `2025-09-08`
                 - Valores: Número de streams para cada DSP/Data
                 
                 **Plataformas suportadas:**
@@ -665,7 +699,10 @@ elif page == "Importação de Dados":
                 with col1:
                     artist_name = st.text_input("Nome do Artista", value="AllMark")
                 with col2:
-                    year = st.number_input("Ano dos dados", min_value=2020, max_value=2026, value=2025)
+                    year = st.number_input(
+                        "Ano dos dados", min_value=2020, max_value=2026, value=2025,
+                        help="Ano da primeira coluna; a virada de ano (ex: dez → jan) é detectada automaticamente"
+                    )
                 
                 if st.button("Processar Analytics", type="primary"):
                     with st.spinner(f"Processando {uploaded_file.name}..."):
@@ -678,7 +715,7 @@ elif page == "Importação de Dados":
                         
                         # Processa
                         processor = AnalyticsCSVProcessor()
-                        result = processor.process_analytics_csv(str(temp_path), artist_name)
+                        result = processor.process_analytics_csv(str(temp_path), artist_name, year=int(year))
                         
                         if result['status'] == 'success':
                             st.success("Arquivo processado com sucesso!")
@@ -726,6 +763,8 @@ elif page == "Importação de Dados":
                                         }), 
                                         use_container_width=True
                                     )
+                        elif result['status'] == 'duplicate':
+                            st.info(f"Arquivo já importado com este ano: {result['message']}")
                         else:
                             st.error(f"Erro no processamento: {result.get('message', 'Erro desconhecido')}")
         
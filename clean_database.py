@@ -2,7 +2,10 @@
 Script para limpar/gerenciar o banco de dados
 Salvar na RAIZ do projeto
 """
-from src.database.models import get_session, Artist, Album, Track, Analytics, CSVImport, init_database
+from src.database.models import (
+    get_session, recompute_revenue, refresh_rollups, set_dsp_rate, init_database, bump_data_generation,
+    Artist, Album, Track, Analytics, AnalyticsFingerprint, AnalyticsRollup, CSVImport, DSP, DSPRate
+)
 from datetime import datetime
 import sys
 
@@ -28,10 +31,10 @@ def show_current_data():
     # Por DSP
     from sqlalchemy import func
     dsp_stats = session.query(
-        Analytics.dsp, 
+        DSP.name, 
         func.count(Analytics.id).label('count'),
         func.sum(Analytics.streams).label('total_streams')
-    ).group_by(Analytics.dsp).all()
+    ).join(DSP, Analytics.dsp_id == DSP.id).group_by(Analytics.dsp_id, DSP.name).all()
     
     if dsp_stats:
         print("\n   Por DSP:")
@@ -60,11 +63,14 @@ def clean_all_data():
             return
         
         # Deleta todos os registros
+        session.query(AnalyticsFingerprint).delete()
+        session.query(AnalyticsRollup).delete()
         deleted_analytics = session.query(Analytics).delete()
         deleted_tracks = session.query(Track).delete()
         deleted_albums = session.query(Album).delete()
         deleted_artists = session.query(Artist).delete()
         deleted_imports = session.query(CSVImport).delete()
+        bump_data_generation(session)
         
         session.commit()
         
@@ -102,6 +108,7 @@ def clean_sample_data_only():
             deleted_imports = session.query(CSVImport).filter(
                 CSVImport.filename.like('%sample%')
             ).delete()
+            bump_data_generation(session)
             
             session.commit()
             print(f"✅ {deleted_imports} importações de exemplo removidas")
@@ -122,16 +129,16 @@ def clean_duplicates():
         # Encontra e remove duplicatas (mantém apenas o mais recente)
         from sqlalchemy import func
         
-        # Agrupa por artist_id, dsp, date e encontra duplicatas
+        # Agrupa por artist_id, dsp_id, date e encontra duplicatas
         duplicates = session.query(
             Analytics.artist_id,
-            Analytics.dsp,
+            Analytics.dsp_id,
             Analytics.date,
             func.count(Analytics.id).label('count'),
             func.max(Analytics.id).label('keep_id')
         ).group_by(
             Analytics.artist_id,
-            Analytics.dsp,
+            Analytics.dsp_id,
             Analytics.date
         ).having(func.count(Analytics.id) > 1).all()
         
@@ -139,16 +146,18 @@ def clean_duplicates():
             print(f"\n🔍 Encontradas {len(duplicates)} combinações com duplicatas")
             
             deleted_count = 0
-            for artist_id, dsp, date, count, keep_id in duplicates:
+            for artist_id, dsp_id, date, count, keep_id in duplicates:
                 # Deleta todos exceto o mais recente
                 deleted = session.query(Analytics).filter(
                     Analytics.artist_id == artist_id,
-                    Analytics.dsp == dsp,
+                    Analytics.dsp_id == dsp_id,
                     Analytics.date == date,
                     Analytics.id != keep_id
                 ).delete()
                 deleted_count += deleted
             
+            refresh_rollups(session)
+            bump_data_generation(session)
             session.commit()
             print(f"✅ {deleted_count} registros duplicados removidos")
         else:
@@ -160,6 +169,54 @@ def clean_duplicates():
     finally:
         session.close()
 
+def show_dsp_rates():
+    """Mostra as tarifas por stream cadastradas"""
+    session = get_session()
+    
+    rates = session.query(DSPRate).join(DSP, DSPRate.dsp_id == DSP.id).order_by(DSP.name, DSPRate.effective_from).all()
+    print(f"\n💲 TARIFAS ({len(rates)} cadastradas):")
+    for rate in rates:
+        until = rate.effective_to.isoformat() if rate.effective_to else "atual"
+        print(f"   - {rate.dsp.name}: ${rate.rate:.4f} ({rate.effective_from.isoformat()} → {until})")
+    
+    session.close()
+
+def update_dsp_rate():
+    """Cadastra uma nova tarifa e recalcula a receita afetada"""
+    session = get_session()
+    
+    try:
+        dsp = input("DSP: ").strip()
+        rate = float(input("Valor por stream (USD): ").replace(',', '.'))
+        effective_from = datetime.strptime(input("Vigente a partir de (AAAA-MM-DD): ").strip(), "%Y-%m-%d").date()
+        
+        set_dsp_rate(session, dsp, rate, effective_from)
+        updated = recompute_revenue(session, dsp=dsp, start_date=effective_from)
+        session.commit()
+        
+        print(f"✅ Tarifa de {dsp} atualizada, {updated} registros recalculados")
+        
+    except Exception as e:
+        session.rollback()
+        print(f"❌ Erro ao atualizar tarifa: {e}")
+    finally:
+        session.close()
+
+def recompute_all_revenue():
+    """Recalcula a receita de todos os analytics com as tarifas atuais"""
+    session = get_session()
+    
+    try:
+        updated = recompute_revenue(session)
+        session.commit()
+        print(f"✅ Receita recalculada em {updated} registros")
+        
+    except Exception as e:
+        session.rollback()
+        print(f"❌ Erro ao recalcular receita: {e}")
+    finally:
+        session.close()
+
 def reset_to_clean_state():
     """Reseta o banco para um estado limpo com apenas o artista AllMark"""
     session = get_session()
@@ -168,6 +225,8 @@ def reset_to_clean_state():
         print("\n🔄 Resetando banco de dados...")
         
         # Limpa tudo
+        session.query(AnalyticsFingerprint).delete()
+        session.query(AnalyticsRollup).delete()
         session.query(Analytics).delete()
         session.query(Track).delete()
         session.query(Album).delete()
@@ -182,6 +241,7 @@ def reset_to_clean_state():
             biography="Artista brasileiro de música pop/rock"
         )
         session.add(artist)
+        bump_data_generation(session)
         session.commit()
         
         print("✅ Banco resetado com sucesso!")
@@ -205,6 +265,9 @@ def main():
         print("3. Limpar apenas dados de exemplo")
         print("4. Remover registros duplicados")
         print("5. Resetar banco (mantém apenas AllMark)")
+        print("6. Ver tarifas por DSP")
+        print("7. Alterar tarifa de um DSP")
+        print("8. Recalcular receita de todos os registros")
         print("0. Sair")
         
         choice = input("\nEscolha uma opção: ")
@@ -219,6 +282,12 @@ def main():
             clean_duplicates()
         elif choice == "5":
             reset_to_clean_state()
+        elif choice == "6":
+            show_dsp_rates()
+        elif choice == "7":
+            update_dsp_rate()
+        elif choice == "8":
+            recompute_all_revenue()
         elif choice == "0":
             print("\n👋 Até logo!")
             break
@@ -236,5 +305,7 @@ if __name__ == "__main__":
             show_current_data()
         elif sys.argv[1] == "--duplicates":
             clean_duplicates()
+        elif sys.argv[1] == "--recompute-revenue":
+            recompute_all_revenue()
     else:
         main()
\ No newline at end of file
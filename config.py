@@ -84,7 +84,7 @@ class Config:
                     "retry_delay": 60
                 },
                 "export": {
-                    "formats": ["csv", "excel", "json"],
+                    "formats": ["csv", "excel", "json", "parquet"],
                     "default_format": "csv",
                     "include_metadata": True
                 }
@@ -3,22 +3,155 @@ Processador para CSVs de Analytics/Streams das DSPs
 """
 import pandas as pd
 import numpy as np
+from sqlalchemy import func, literal_column, select
 from datetime import datetime, date
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import calendar
+import hashlib
 import logging
+import re
 import sys
 import os
 
 # Adiciona o diretório pai ao path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.database.models import get_session, Artist, Analytics, CSVImport
+from src.database.models import (
+    get_session, upsert_analytics, upsert_fingerprints, refresh_rollups, resolve_dsp_ids,
+    get_data_generation, bump_data_generation,
+    Artist, Analytics, AnalyticsFingerprint, AnalyticsRollup, CSVImport, DSP, DSPRate,
+    DEFAULT_RATE, ROLLUP_PERIOD_SQL, period_bounds
+)
+from src.csv_processors.summary_cache import summary_cache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Abreviações de meses em português e inglês
+MONTH_MAP = {
+    'jan': 1, 'fev': 2, 'feb': 2, 'mar': 3, 'abr': 4, 'apr': 4,
+    'mai': 5, 'may': 5, 'jun': 6, 'jul': 7, 'ago': 8, 'aug': 8,
+    'set': 9, 'sep': 9, 'out': 10, 'oct': 10, 'nov': 11, 'dez': 12, 'dec': 12
+}
+ISO_DATE_RE = re.compile(r'^(\d{4})-(\d{1,2})-(\d{1,2})$')
+EXPORT_DATE_RE = re.compile(r'(\d{4})-(\d{2})-(\d{2})')
+
+
+@lru_cache(maxsize=4096)
+def _parse_date_header(header: str) -> Optional[Tuple[Optional[int], int, int]]:
+    """
+    Converte um cabeçalho de data em (ano, mês, dia)
+    
+    Aceita "8 set", "set 8", "8 Sep 2025", "Sep 8" e ISO "2025-09-08". O ano é
+    None quando não aparece no cabeçalho. Cabeçalhos de intervalo
+    ("16 jun - 22 jun 2025") ou não reconhecidos retornam None.
+    """
+    text = header.strip().lower()
+    
+    match = ISO_DATE_RE.match(text)
+    if match:
+        year, month, day = (int(part) for part in match.groups())
+        return year, month, day
+    
+    parts = text.replace('.', ' ').replace(',', ' ').split()
+    year = None
+    if len(parts) == 3 and parts[2].isdigit() and len(parts[2]) == 4:
+        year = int(parts.pop())
+    if len(parts) != 2:
+        return None
+    
+    if parts[0].isdigit():
+        day, month_name = parts
+    elif parts[1].isdigit():
+        month_name, day = parts
+    else:
+        return None
+    
+    month = MONTH_MAP.get(month_name[:3])
+    if month is None or not 1 <= int(day) <= 31:
+        return None
+    return year, month, int(day)
+
+
+def build_date_index(columns: Iterable[str], year: Optional[int] = None,
+                     reference_date: Optional[date] = None) -> Dict[str, date]:
+    """
+    Converte os cabeçalhos de data de um arquivo em um índice coluna -> data
+    
+    O ano avança (ou recua, em arquivos em ordem decrescente) quando o mês dá
+    a volta entre colunas vizinhas, como em "28 dez ... 3 jan". Quando o ano é
+    inferido de reference_date e há uma coluna "29 fev", recua até um ano
+    bissexto em vez de descartá-la.
+    
+    Args:
+        columns: Cabeçalhos das colunas de data, na ordem do arquivo
+        year: Ano da primeira coluna; se None, é inferido das colunas com ano
+            explícito ou de reference_date
+        reference_date: Data da exportação; a última coluna não pode ser posterior
+            a ela (padrão: hoje)
+        
+    Returns:
+        Dicionário coluna -> data, apenas com as colunas reconhecidas
+    """
+    parsed = [(col, _parse_date_header(str(col))) for col in columns]
+    parsed = [(col, header) for col, header in parsed if header is not None]
+    if not parsed:
+        return {}
+    
+    # Deslocamento de ano de cada coluna em relação à primeira
+    offsets = []
+    offset = 0
+    previous_month = None
+    for _, (_, month, _) in parsed:
+        if previous_month is not None:
+            if month - previous_month < -6:
+                offset += 1
+            elif month - previous_month > 6:
+                offset -= 1
+        previous_month = month
+        offsets.append(offset)
+    
+    # Colunas com ano explícito ancoram as demais
+    anchors = [(header[0], offset) for (_, header), offset in zip(parsed, offsets) if header[0]]
+    if year is None and anchors:
+        year = anchors[0][0] - anchors[0][1]
+    
+    if year is None:
+        reference_date = reference_date or date.today()
+        _, last_month, last_day = parsed[-1][1]
+        year = reference_date.year - offsets[-1]
+        if (last_month, last_day) > (reference_date.month, reference_date.day):
+            year -= 1
+        
+        leap_offsets = [offset for (_, (_, month, day)), offset in zip(parsed, offsets) if (month, day) == (2, 29)]
+        for candidate in range(year, year - 8, -1):
+            if all(calendar.isleap(candidate + offset) for offset in leap_offsets):
+                year = candidate
+                break
+    
+    date_index = {}
+    for (col, (header_year, month, day)), offset in zip(parsed, offsets):
+        try:
+            date_index[col] = date(header_year or year + offset, month, day)
+        except ValueError:
+            logger.warning(f"Data inválida no cabeçalho: {col}")
+    return date_index
+
+
+def export_date_from_filename(filepath: str) -> Optional[date]:
+    """Extrai a data de exportação do nome do arquivo (ex: ...-2025-09-16.csv)"""
+    match = EXPORT_DATE_RE.search(Path(filepath).name)
+    if not match:
+        return None
+    try:
+        return date(*(int(part) for part in match.groups()))
+    except ValueError:
+        return None
+
+
 class AnalyticsCSVProcessor:
     """Processador especializado para CSVs de Analytics/Streams"""
     
@@ -34,197 +167,652 @@ class AnalyticsCSVProcessor:
             'Facebook', 'Instagram', 'TikTok', 'Snapchat'
         ]
     
-    def process_analytics_csv(self, filepath: str, artist_name: str = "AllMark") -> Dict:
+    def process_analytics_csv(self, filepath: str, artist_name: str = "AllMark",
+                              year: Optional[int] = None, delta: bool = False) -> Dict:
         """
         Processa CSV de analytics/streams
         
         Args:
             filepath: Caminho do arquivo CSV
             artist_name: Nome do artista (padrão: AllMark)
+            year: Ano da primeira coluna de data; se None, é inferido da data da exportação
+            delta: Compara com os dados gravados e grava apenas novos/alterados
             
         Returns:
             Dicionário com resultado do processamento
         """
         logger.info(f"Processando arquivo: {filepath}")
+        filename = Path(filepath).name
+        import_record = None
         
-        # Registra importação
-        import_record = CSVImport(
-            filename=Path(filepath).name,
-            distributor="general",
-            import_type="analytics",
-            status="processing"
-        )
-        self.session.add(import_record)
+        try:
+            # Arquivos idênticos a uma importação concluída não são reprocessados
+            content_hash = self.file_hash(filepath)
+            artist = self._get_or_create_artist(artist_name)
+            duplicate = self.find_duplicate_import(content_hash, artist.id, year)
+            if duplicate:
+                return self._duplicate_result(filename, artist_name, duplicate)
+            
+            # Registra importação
+            import_record = CSVImport(
+                filename=filename,
+                distributor="general",
+                import_type="analytics",
+                status="processing",
+                artist_id=artist.id,
+                content_hash=content_hash,
+                file_size=os.path.getsize(filepath),
+                data_year=year
+            )
+            self.session.add(import_record)
+            self.session.commit()
+            
+            parsed = self.parse_analytics_file(filepath, year)
+            return self.save_parsed_analytics(parsed, artist_name, import_record, delta)
+            
+        except Exception as e:
+            logger.error(f"Erro no processamento: {e}")
+            self.session.rollback()
+            
+            # Atualiza registro de importação com erro
+            if import_record is not None:
+                import_record.status = "error"
+                import_record.error_message = str(e)
+                self.session.commit()
+            
+            return {
+                'status': 'error',
+                'message': str(e)
+            }
+        finally:
+            self.session.close()
+    
+    @staticmethod
+    def file_hash(filepath: str) -> str:
+        """
+        Calcula o SHA-256 do conteúdo do arquivo, lendo em blocos
+        
+        Args:
+            filepath: Caminho do arquivo
+            
+        Returns:
+            Hash hexadecimal do conteúdo
+        """
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def find_duplicate_import(self, content_hash: str, artist_id: int,
+                              year: Optional[int] = None) -> Optional[CSVImport]:
+        """
+        Procura uma importação concluída com o mesmo conteúdo e o mesmo ano para o artista
+        
+        O ano faz parte da chave: o mesmo arquivo importado com outro "Ano dos
+        dados" gera outras datas, então pode ser reimportado para corrigir o ano.
+        
+        Args:
+            content_hash: Hash retornado por file_hash
+            artist_id: ID do artista
+            year: Ano informado para as colunas de data (None = inferido)
+            
+        Returns:
+            CSVImport anterior ou None
+        """
+        return self.session.query(CSVImport).filter_by(
+            content_hash=content_hash,
+            artist_id=artist_id,
+            data_year=year,
+            status="completed"
+        ).first()
+    
+    @staticmethod
+    def _duplicate_result(filename: str, artist_name: str, duplicate: CSVImport) -> Dict:
+        """Resultado retornado quando o arquivo já foi importado"""
+        logger.info(f"Arquivo {filename} idêntico à importação {duplicate.id}, ignorado")
+        return {
+            'status': 'duplicate',
+            'file': filename,
+            'artist': artist_name,
+            'duplicate_of': duplicate.id,
+            'message': f"Conteúdo idêntico a '{duplicate.filename}', já importado em "
+                       f"{duplicate.imported_at.strftime('%Y-%m-%d %H:%M')}"
+        }
+    
+    @staticmethod
+    def parse_analytics_file(filepath: str, year: Optional[int] = None) -> Dict:
+        """
+        Lê um CSV de analytics e o normaliza para o formato longo
+        
+        Não acessa o banco de dados, então pode ser executado em paralelo
+        em outros processos (ver batch_importer).
+        
+        Args:
+            filepath: Caminho do arquivo CSV
+            year: Ano da primeira coluna de data; se None, é inferido da data da exportação
+            
+        Returns:
+            Dicionário com os registros normalizados e metadados do arquivo
+        """
+        # Lê o CSV
+        df = pd.read_csv(filepath, encoding='utf-8')
+        logger.info(f"CSV carregado: {len(df)} linhas, {len(df.columns)} colunas")
+        logger.info(f"Colunas encontradas: {df.columns.tolist()}")
+        
+        # Parse das datas uma única vez por arquivo
+        date_columns = [col for col in df.columns if col != 'DSP']
+        date_index = AnalyticsCSVProcessor._build_file_date_index(filepath, date_columns, year)
+        
+        # Converte o formato largo (DSP x datas) em formato longo
+        records, rows_error = AnalyticsCSVProcessor._to_long_format(df, date_index)
+        rows_error += len(df) * (len(date_columns) - len(date_index))
+        
+        return {
+            'file': Path(filepath).name,
+            'records': records,
+            'date_index': date_index,
+            'rows_processed': len(df) * len(date_columns),
+            'rows_error': rows_error,
+            'dsps': df['DSP'].unique().tolist(),
+            'date_range': AnalyticsCSVProcessor._format_date_range(date_index)
+        }
+    
+    @staticmethod
+    def _build_file_date_index(filepath: str, date_columns: List[str],
+                               year: Optional[int] = None) -> Dict[str, date]:
+        """
+        Monta o índice de datas de um arquivo, registrando as colunas ignoradas
+        
+        Args:
+            filepath: Caminho do arquivo (a data da exportação vem do nome)
+            date_columns: Cabeçalhos das colunas de data
+            year: Ano da primeira coluna, se informado pelo usuário
+            
+        Returns:
+            Dicionário coluna -> data
+            
+        Raises:
+            ValueError: Nenhuma coluna de data reconhecida (o arquivo não é
+                marcado como importado e pode ser reprocessado)
+        """
+        date_index = build_date_index(date_columns, year, export_date_from_filename(filepath))
+        if not date_index:
+            raise ValueError(
+                f"Nenhuma coluna de data reconhecida em {Path(filepath).name}: {date_columns[:3]}"
+            )
+        logger.info(f"Colunas de data identificadas: {list(date_index)}")
+        
+        skipped = [col for col in date_columns if col not in date_index]
+        if skipped:
+            logger.warning(f"Colunas de data não reconhecidas (ignoradas): {skipped}")
+        return date_index
+    
+    @staticmethod
+    def _format_date_range(date_index: Dict[str, date]) -> Optional[str]:
+        """Formata o período coberto pelo índice de datas"""
+        if not date_index:
+            return None
+        return f"{min(date_index.values()).isoformat()} - {max(date_index.values()).isoformat()}"
+    
+    def save_parsed_analytics(self, parsed: Dict, artist_name: str, import_record: CSVImport,
+                              delta: bool = False) -> Dict:
+        """
+        Grava os registros de um arquivo já normalizado por parse_analytics_file
+        
+        Args:
+            parsed: Resultado de parse_analytics_file
+            artist_name: Nome do artista
+            import_record: Registro da importação a ser concluído
+            delta: Compara com os dados gravados e grava apenas novos/alterados
+            
+        Returns:
+            Dicionário com resultado do processamento
+        """
+        records = parsed['records']
+        
+        # Obtém ou cria o artista
+        artist = self._get_or_create_artist(artist_name)
+        
+        # Grava todos os registros em uma única operação
+        rows_success, write_stats = self._bulk_upsert(artist.id, records, import_record.id, delta)
+        
+        # Atualiza registro de importação na mesma transação dos dados
+        import_record.status = "completed"
+        import_record.rows_processed = parsed['rows_processed']
+        import_record.rows_success = rows_success
+        import_record.rows_error = parsed['rows_error']
         self.session.commit()
         
+        # Estatísticas
+        result = {
+            'status': 'success',
+            'file': parsed['file'],
+            'artist': artist_name,
+            'rows_processed': parsed['rows_processed'],
+            'rows_success': rows_success,
+            'rows_written': write_stats['written'],
+            'rows_unchanged': write_stats['unchanged'],
+            'rows_error': parsed['rows_error'],
+            'dsps': parsed['dsps'],
+            'date_range': parsed['date_range'],
+            'total_streams': int(records.drop_duplicates(subset=['dsp', 'date'], keep='last')['streams'].sum())
+        }
+        if delta:
+            result['delta'] = {key: write_stats[key] for key in ('new', 'changed', 'unchanged')}
+        
+        logger.info(f"Processamento concluído: {result}")
+        return result
+    
+    def process_analytics_csv_streaming(self, filepath: str, artist_name: str = "AllMark",
+                                        year: Optional[int] = None,
+                                        chunksize: int = 5000, commit_every: int = 50000,
+                                        progress_callback: Optional[Callable[[Dict], None]] = None,
+                                        resume: bool = True, delta: bool = False) -> Dict:
+        """
+        Processa CSV de analytics em blocos, para arquivos muito grandes
+        
+        O arquivo é lido em blocos de tamanho fixo e os dados são gravados a cada
+        `commit_every` linhas. O número de linhas já gravadas fica registrado no
+        CSVImport na mesma transação dos dados, então uma importação interrompida
+        pode ser retomada a partir do último bloco gravado. Os totais por DSP
+        canônico/data são acumulados para o arquivo inteiro (inclusive as linhas
+        já gravadas, ao retomar), então variantes em blocos diferentes resultam
+        nos mesmos valores da importação em lote.
+        
+        Args:
+            filepath: Caminho do arquivo CSV
+            artist_name: Nome do artista (padrão: AllMark)
+            year: Ano da primeira coluna de data; se None, é inferido da data da exportação
+            chunksize: Número de linhas lidas por bloco
+            commit_every: Número de linhas entre commits
+            progress_callback: Função chamada com o progresso após cada commit
+            resume: Retoma a última importação inacabada do mesmo arquivo
+            delta: Compara com os dados gravados e grava apenas novos/alterados
+            
+        Returns:
+            Dicionário com resultado do processamento
+        """
+        filename = Path(filepath).name
+        logger.info(f"Processando arquivo em modo streaming: {filepath}")
+        
+        import_record = None
+        rows_committed = 0
+        pending_rows = 0
+        write_totals = {'written': 0, 'unchanged': 0, 'new': 0, 'changed': 0}
+        running = {}
+        dsps = set()
+        date_columns = []
+        date_index = None
+        
         try:
-            # Lê o CSV
-            df = pd.read_csv(filepath, encoding='utf-8')
-            logger.info(f"CSV carregado: {len(df)} linhas, {len(df.columns)} colunas")
-            logger.info(f"Colunas encontradas: {df.columns.tolist()}")
+            content_hash = self.file_hash(filepath)
+            artist = self._get_or_create_artist(artist_name)
+            duplicate = self.find_duplicate_import(content_hash, artist.id, year)
+            if duplicate:
+                return self._duplicate_result(filename, artist_name, duplicate)
             
-            # Obtém ou cria o artista
-            artist = self.session.query(Artist).filter_by(name=artist_name).first()
-            if not artist:
-                artist = Artist(name=artist_name)
-                self.session.add(artist)
-                self.session.commit()
-                logger.info(f"Artista '{artist_name}' criado")
+            # Retoma a importação anterior (com o mesmo ano) ou registra uma nova
+            if resume:
+                import_record = self.session.query(CSVImport).filter(
+                    CSVImport.content_hash == content_hash,
+                    CSVImport.artist_id == artist.id,
+                    CSVImport.data_year == year,
+                    CSVImport.import_type == "analytics_stream",
+                    CSVImport.status.in_(["processing", "error"])
+                ).order_by(CSVImport.id.desc()).first()
             
-            # Identifica colunas de data (formato: "8 set", "9 set", etc)
-            date_columns = [col for col in df.columns if col != 'DSP']
-            logger.info(f"Colunas de data identificadas: {date_columns}")
+            if import_record:
+                logger.info(f"Retomando importação {import_record.id} a partir da linha {import_record.rows_committed}")
+            else:
+                import_record = CSVImport(
+                    filename=filename,
+                    distributor="general",
+                    import_type="analytics_stream",
+                    artist_id=artist.id,
+                    content_hash=content_hash,
+                    file_size=os.path.getsize(filepath),
+                    data_year=year,
+                    rows_committed=0,
+                    rows_processed=0,
+                    rows_success=0,
+                    rows_error=0
+                )
+                self.session.add(import_record)
             
-            # Processa dados
-            rows_success = 0
-            rows_error = 0
+            import_record.status = "processing"
+            import_record.error_message = None
+            self.session.commit()
+            
+            resumed_from = import_record.rows_committed or 0
+            rows_committed = resumed_from
             
-            for _, row in df.iterrows():
-                dsp = row['DSP']
+            reader = pd.read_csv(filepath, encoding='utf-8', chunksize=chunksize)
+            
+            for chunk in reader:
+                if date_index is None:
+                    # Parse das datas uma única vez para o arquivo inteiro
+                    date_columns = [col for col in chunk.columns if col != 'DSP']
+                    date_index = self._build_file_date_index(filepath, date_columns, year)
                 
-                for date_col in date_columns:
-                    try:
-                        # Parse da data (formato: "DD mes")
-                        date_obj = self._parse_date(date_col, 2024)  # Assume ano atual
-                        
-                        # Valor de streams
-                        streams = row[date_col]
-                        if pd.isna(streams) or streams == 0:
-                            continue
-                        
-                        # Verifica se já existe registro para esta data/DSP
-                        existing = self.session.query(Analytics).filter_by(
-                            artist_id=artist.id,
-                            dsp=dsp,
-                            date=date_obj
-                        ).first()
-                        
-                        if existing:
-                            # Atualiza streams
-                            existing.streams = int(streams)
-                            logger.debug(f"Atualizado: {dsp} - {date_obj} - {streams} streams")
-                        else:
-                            # Cria novo registro
-                            analytics = Analytics(
-                                artist_id=artist.id,
-                                dsp=dsp,
-                                date=date_obj,
-                                streams=int(streams),
-                                revenue=self._estimate_revenue(dsp, int(streams)),
-                                territory="Global"
-                            )
-                            self.session.add(analytics)
-                            logger.debug(f"Adicionado: {dsp} - {date_obj} - {streams} streams")
-                        
-                        rows_success += 1
-                        
-                    except Exception as e:
-                        logger.error(f"Erro ao processar {dsp} - {date_col}: {e}")
-                        rows_error += 1
-            
-            # Commit das alterações
-            self.session.commit()
+                # Linhas já gravadas só entram nos totais do arquivo
+                committed = chunk.index < resumed_from
+                if committed.any():
+                    records, _ = self._to_long_format(chunk[committed], date_index)
+                    records = records.drop_duplicates(subset=['dsp', 'date'], keep='last')
+                    dsp_ids = resolve_dsp_ids(self.session, records['dsp'].unique().tolist())
+                    self._accumulate_running_totals(records.assign(dsp_id=records['dsp'].map(dsp_ids)), running)
+                    chunk = chunk[~committed]
+                    if chunk.empty:
+                        continue
+                
+                records, rows_error = self._to_long_format(chunk, date_index)
+                rows_error += len(chunk) * (len(date_columns) - len(date_index))
+                rows_success, write_stats = self._bulk_upsert(artist.id, records, import_record.id, delta, running)
+                
+                pending_rows += len(chunk)
+                for key, value in write_stats.items():
+                    write_totals[key] += value
+                import_record.rows_processed += len(chunk) * len(date_columns)
+                import_record.rows_success += rows_success
+                import_record.rows_error += rows_error
+                dsps.update(chunk['DSP'].astype(str).unique())
+                
+                if pending_rows >= commit_every:
+                    rows_committed += pending_rows
+                    pending_rows = 0
+                    self._commit_checkpoint(import_record, rows_committed, progress_callback)
             
-            # Atualiza registro de importação
+            rows_committed += pending_rows
             import_record.status = "completed"
-            import_record.rows_processed = len(df) * len(date_columns)
-            import_record.rows_success = rows_success
-            import_record.rows_error = rows_error
-            self.session.commit()
+            self._commit_checkpoint(import_record, rows_committed, progress_callback)
             
-            # Estatísticas
             result = {
                 'status': 'success',
-                'file': Path(filepath).name,
+                'file': filename,
                 'artist': artist_name,
-                'rows_processed': len(df) * len(date_columns),
-                'rows_success': rows_success,
-                'rows_error': rows_error,
-                'dsps': df['DSP'].unique().tolist(),
-                'date_range': f"{date_columns[0]} - {date_columns[-1]}",
-                'total_streams': df[date_columns].sum().sum()
+                'rows_processed': import_record.rows_processed,
+                'rows_success': import_record.rows_success,
+                'rows_written': write_totals['written'],
+                'rows_unchanged': write_totals['unchanged'],
+                'rows_error': import_record.rows_error,
+                'rows_committed': rows_committed,
+                'resumed_from': resumed_from,
+                'dsps': sorted(dsps),
+                'date_range': self._format_date_range(date_index or {}),
+                'total_streams': sum(sum(variants.values()) for variants in running.values())
             }
+            if delta:
+                result['delta'] = {key: write_totals[key] for key in ('new', 'changed', 'unchanged')}
             
             logger.info(f"Processamento concluído: {result}")
             return result
             
         except Exception as e:
-            logger.error(f"Erro no processamento: {e}")
+            logger.error(f"Erro no processamento (linha {rows_committed} gravada): {e}")
             
-            # Atualiza registro de importação com erro
-            import_record.status = "error"
-            import_record.error_message = str(e)
-            self.session.commit()
+            # Descarta apenas o bloco pendente; os blocos gravados permanecem
+            self.session.rollback()
+            if import_record is not None:
+                import_record.status = "error"
+                import_record.error_message = str(e)
+                self.session.commit()
             
             return {
                 'status': 'error',
-                'message': str(e)
+                'message': str(e),
+                'rows_committed': import_record.rows_committed if import_record is not None else 0
             }
         finally:
             self.session.close()
     
-    def _parse_date(self, date_str: str, year: int = 2024) -> date:
+    def _commit_checkpoint(self, import_record: CSVImport, rows_committed: int,
+                           progress_callback: Optional[Callable[[Dict], None]] = None) -> None:
+        """
+        Grava o bloco pendente junto com o ponto de retomada da importação
+        
+        Args:
+            import_record: Registro da importação em andamento
+            rows_committed: Total de linhas do CSV gravadas até aqui
+            progress_callback: Função opcional notificada com o progresso
+        """
+        import_record.rows_committed = rows_committed
+        self.session.commit()
+        
+        progress = {
+            'import_id': import_record.id,
+            'rows_committed': rows_committed,
+            'rows_success': import_record.rows_success,
+            'rows_error': import_record.rows_error
+        }
+        logger.info(f"Progresso: {rows_committed} linhas gravadas")
+        if progress_callback:
+            progress_callback(progress)
+    
+    def _get_or_create_artist(self, artist_name: str) -> Artist:
         """
-        Converte string de data para objeto date
+        Obtém o artista pelo nome, criando-o se ainda não existir
         
         Args:
-            date_str: String no formato "DD mes" (ex: "8 set")
-            year: Ano a ser usado
+            artist_name: Nome do artista
             
         Returns:
-            Objeto date
+            Instância de Artist
         """
-        # Mapeamento de meses em português
-        month_map = {
-            'jan': 1, 'fev': 2, 'mar': 3, 'abr': 4, 'mai': 5, 'jun': 6,
-            'jul': 7, 'ago': 8, 'set': 9, 'out': 10, 'nov': 11, 'dez': 12
-        }
+        artist = self.session.query(Artist).filter_by(name=artist_name).first()
+        if not artist:
+            artist = Artist(name=artist_name)
+            self.session.add(artist)
+            self.session.commit()
+            logger.info(f"Artista '{artist_name}' criado")
+        return artist
+    
+    @staticmethod
+    def _to_long_format(df: pd.DataFrame, date_index: Dict[str, date]) -> Tuple[pd.DataFrame, int]:
+        """
+        Converte o DataFrame largo (uma coluna por data) em formato longo
+        
+        Args:
+            df: DataFrame com a coluna DSP e uma coluna por data
+            date_index: Mapeamento coluna -> data já convertida
+            
+        Returns:
+            Tupla (DataFrame com colunas dsp/date/streams, quantidade de células inválidas)
+        """
+        long_df = df.melt(
+            id_vars='DSP',
+            value_vars=list(date_index.keys()),
+            var_name='date_col',
+            value_name='raw_streams'
+        )
+        
+        # Valores não numéricos viram NaN e são contabilizados como erro
+        streams = pd.to_numeric(long_df['raw_streams'], errors='coerce')
+        rows_error = int((streams.isna() & long_df['raw_streams'].notna()).sum())
+        
+        # Ignora células vazias ou zeradas
+        valid = streams.notna() & (streams != 0)
+        long_df = pd.DataFrame({
+            'dsp': long_df.loc[valid, 'DSP'].astype(str),
+            'date': long_df.loc[valid, 'date_col'].map(date_index),
+            'streams': streams[valid].astype('int64')
+        })
+        
+        return long_df.reset_index(drop=True), rows_error
+    
+    def _bulk_upsert(self, artist_id: int, records: pd.DataFrame,
+                     import_id: Optional[int] = None, delta: bool = False,
+                     running: Optional[Dict] = None) -> Tuple[int, Dict]:
+        """
+        Insere ou atualiza os registros de analytics em lote
+        
+        Cada célula DSP/data recebe uma impressão digital do seu conteúdo; células
+        cuja impressão já está gravada para o artista não são reescritas. No modo
+        delta a comparação é feita diretamente com os streams gravados, separando
+        células novas, alteradas e inalteradas.
+        
+        Args:
+            artist_id: ID do artista
+            records: DataFrame com colunas dsp (nome do CSV)/date/streams
+            import_id: ID da importação que originou os registros
+            delta: Compara com os dados gravados em vez das impressões digitais
+            running: Totais do arquivo inteiro por (dsp_id, data) e nome do CSV, usados
+                na importação em blocos para que variantes em blocos diferentes sejam
+                somadas como na importação em lote (atualizado por esta chamada)
+            
+        Returns:
+            Tupla (registros válidos, contagem de gravados/inalterados e, no modo delta, novos/alterados)
+        """
+        stats = {'written': 0, 'unchanged': 0}
+        if delta:
+            stats.update(new=0, changed=0)
+        if records.empty:
+            return 0, stats
+        
+        # Mantém apenas a última ocorrência de cada DSP/data do arquivo
+        records = records.drop_duplicates(subset=['dsp', 'date'], keep='last')
+        
+        # Variantes do mesmo DSP ("Deezer_30", apelidos) são somadas no DSP canônico
+        dsp_ids = resolve_dsp_ids(self.session, records['dsp'].unique().tolist())
+        records = records.assign(dsp_id=records['dsp'].map(dsp_ids).astype('int64'))
+        if running is None:
+            records = records.groupby(['dsp_id', 'date'], as_index=False, sort=False)['streams'].sum()
+        else:
+            records = self._accumulate_running_totals(records, running)
+        records['fingerprint'] = pd.util.hash_pandas_object(
+            records[['dsp_id', 'date', 'streams']], index=False
+        ).astype('int64')
+        
+        if delta:
+            changed, diff = self._diff_against_store(artist_id, records)
+            stats.update(diff)
+        else:
+            # Carrega em uma única consulta as impressões já gravadas do período
+            known = self.session.query(AnalyticsFingerprint.fingerprint).filter(
+                AnalyticsFingerprint.artist_id == artist_id,
+                AnalyticsFingerprint.date.between(records['date'].min(), records['date'].max())
+            ).all()
+            known_fingerprints = np.array([row[0] for row in known], dtype='int64')
+            changed = records[~records['fingerprint'].isin(known_fingerprints)]
+            stats['unchanged'] = len(records) - len(changed)
         
-        parts = date_str.strip().split()
-        if len(parts) == 2:
-            day = int(parts[0])
-            month = month_map.get(parts[1].lower(), 9)  # Default setembro
-            return date(year, month, day)
+        rows_success = len(records)
+        if changed.empty:
+            logger.info(f"Gravação em lote: nenhuma alteração em {rows_success} registros")
+            return rows_success, stats
         
-        # Fallback para data atual
-        return date.today()
+        changed = changed.assign(
+            artist_id=artist_id,
+            territory="Global",
+            import_id=import_id,
+            revenue=self._estimate_revenue_series(changed)
+        )
+        
+        # Um único INSERT ... ON CONFLICT DO UPDATE para todo o lote
+        stats['written'] = upsert_analytics(
+            self.session,
+            changed[['artist_id', 'dsp_id', 'date', 'streams', 'revenue', 'territory']].to_dict('records')
+        )
+        upsert_fingerprints(
+            self.session,
+            changed[['artist_id', 'dsp_id', 'date', 'fingerprint', 'import_id']].to_dict('records')
+        )
+        # Recalcula só os períodos e DSPs tocados, na mesma transação da gravação
+        refresh_rollups(
+            self.session, changed['date'].min(), changed['date'].max(),
+            artist_id=artist_id, dsp_ids=changed['dsp_id'].unique()
+        )
+        bump_data_generation(self.session)
+        
+        logger.info(f"Gravação em lote: {stats['written']} de {rows_success} registros gravados")
+        return rows_success, stats
+    
+    @staticmethod
+    def _accumulate_running_totals(records: pd.DataFrame, running: Dict) -> pd.DataFrame:
+        """
+        Acumula um bloco nos totais do arquivo e devolve o total atual das células tocadas
+        
+        Args:
+            records: DataFrame com colunas dsp/dsp_id/date/streams, sem DSP/data repetidos
+            running: Dicionário (dsp_id, data) -> {nome no CSV: streams}
+            
+        Returns:
+            DataFrame com colunas dsp_id/date/streams, com a soma das variantes já lidas
+        """
+        touched = {}
+        for dsp, dsp_id, day, streams in records[['dsp', 'dsp_id', 'date', 'streams']].itertuples(index=False):
+            running.setdefault((dsp_id, day), {})[dsp] = streams
+            touched[(dsp_id, day)] = None
+        return pd.DataFrame(
+            [(dsp_id, day, sum(running[(dsp_id, day)].values())) for dsp_id, day in touched],
+            columns=['dsp_id', 'date', 'streams']
+        ).astype({'dsp_id': 'int64', 'streams': 'int64'})
     
-    def _estimate_revenue(self, dsp: str, streams: int) -> float:
+    def _diff_against_store(self, artist_id: int, records: pd.DataFrame) -> Tuple[pd.DataFrame, Dict]:
         """
-        Estima receita baseada no DSP e número de streams
+        Compara os registros recebidos com os streams já gravados no período
         
         Args:
-            dsp: Nome do DSP
-            streams: Número de streams
+            artist_id: ID do artista
+            records: DataFrame com colunas dsp_id/date/streams
             
         Returns:
-            Receita estimada em USD
-        """
-        # Valores médios por stream (em USD)
-        # Fonte: Estimativas da indústria
-        revenue_per_stream = {
-            'Spotify': 0.003,
-            'Apple Music': 0.007,
-            'YouTube Music': 0.002,
-            'YouTube': 0.001,
-            'Amazon Music': 0.004,
-            'Deezer': 0.006,
-            'Tidal': 0.012,
-            'SoundCloud': 0.003,
-            'Pandora': 0.002,
-            'Facebook': 0.004,
-            'Instagram': 0.003,
-            'TikTok': 0.003,
-            'Snapchat': 0.002
+            Tupla (registros novos ou alterados, contagem de novos/alterados/inalterados)
+        """
+        # Uma única consulta traz o recorte (dsp_id, date) -> streams do período do arquivo
+        stored = self.session.query(
+            Analytics.dsp_id, Analytics.date, Analytics.streams
+        ).filter(
+            Analytics.artist_id == artist_id,
+            Analytics.date.between(records['date'].min(), records['date'].max())
+        ).all()
+        stored = pd.DataFrame(stored, columns=['dsp_id', 'date', 'stored_streams'])
+        
+        merged = records.merge(stored, on=['dsp_id', 'date'], how='left')
+        is_new = merged['stored_streams'].isna()
+        is_changed = ~is_new & (merged['streams'] != merged['stored_streams'])
+        
+        diff = {
+            'new': int(is_new.sum()),
+            'changed': int(is_changed.sum()),
+            'unchanged': int((~is_new & ~is_changed).sum())
         }
+        changed = merged.loc[is_new | is_changed, records.columns]
+        return changed, diff
+    
+    def _estimate_revenue_series(self, records: pd.DataFrame) -> pd.Series:
+        """
+        Estima a receita de cada registro com a tarifa vigente na sua data
+        
+        As tarifas são lidas da tabela dsp_rates em uma única consulta e
+        associadas aos registros de forma vetorizada.
         
-        rate = revenue_per_stream.get(dsp, 0.003)  # Default
-        return round(streams * rate, 2)
+        Args:
+            records: DataFrame com colunas dsp_id/date/streams
+            
+        Returns:
+            Série com a receita estimada em USD, alinhada ao índice de records
+        """
+        rates = self.session.query(
+            DSPRate.dsp_id, DSPRate.rate, DSPRate.effective_from, DSPRate.effective_to
+        ).filter(DSPRate.dsp_id.in_(records['dsp_id'].unique().tolist())).all()
+        rates = pd.DataFrame(rates, columns=['dsp_id', 'rate', 'effective_from', 'effective_to'])
+        
+        candidates = records[['dsp_id', 'date']].reset_index().merge(rates, on='dsp_id')
+        in_range = (candidates['date'] >= candidates['effective_from']) & (
+            candidates['effective_to'].isna() | (candidates['date'] < candidates['effective_to'])
+        )
+        rate = candidates[in_range].drop_duplicates('index', keep='last').set_index('index')['rate']
+        
+        rate = rate.reindex(records.index).fillna(DEFAULT_RATE)
+        return (records['streams'] * rate).round(2)
     
     def get_analytics_summary(self, artist_name: str = "AllMark") -> Dict:
         """
         Obtém resumo dos analytics de um artista
         
+        O resultado fica em cache até a próxima alteração dos dados.
+        
         Args:
             artist_name: Nome do artista
             
@@ -232,50 +820,367 @@ class AnalyticsCSVProcessor:
             Dicionário com resumo
         """
         try:
+            # Resultados em cache valem enquanto a geração dos dados não mudar
+            generation = get_data_generation(self.session)
+            cache_key = ('summary', artist_name)
+            cached = summary_cache.get(cache_key, generation)
+            if cached is not None:
+                return cached
+            
             artist = self.session.query(Artist).filter_by(name=artist_name).first()
             if not artist:
                 return {'error': f'Artista {artist_name} não encontrado'}
             
-            analytics = self.session.query(Analytics).filter_by(artist_id=artist.id).all()
+            # Uma única consulta agregada sobre os rollups mensais: uma linha por DSP
+            rows = self.session.query(
+                DSP.name,
+                func.sum(AnalyticsRollup.streams),
+                func.sum(AnalyticsRollup.revenue),
+                func.sum(AnalyticsRollup.days),
+                func.min(AnalyticsRollup.first_date),
+                func.max(AnalyticsRollup.last_date)
+            ).join(
+                DSP, AnalyticsRollup.dsp_id == DSP.id
+            ).filter(
+                AnalyticsRollup.artist_id == artist.id,
+                AnalyticsRollup.grain == 'month'
+            ).group_by(AnalyticsRollup.dsp_id, DSP.name).all()
             
-            if not analytics:
-                return {
+            if not rows:
+                summary = {
                     'artist': artist_name,
                     'total_streams': 0,
                     'total_revenue': 0,
                     'dsps': []
                 }
+                summary_cache.put(cache_key, generation, summary)
+                return summary
             
-            # Agrupa por DSP
-            dsp_summary = {}
-            for record in analytics:
-                if record.dsp not in dsp_summary:
-                    dsp_summary[record.dsp] = {
-                        'streams': 0,
-                        'revenue': 0,
-                        'days': 0
-                    }
-                dsp_summary[record.dsp]['streams'] += record.streams
-                dsp_summary[record.dsp]['revenue'] += record.revenue
-                dsp_summary[record.dsp]['days'] += 1
+            dsp_summary = {
+                name: {
+                    'streams': int(streams or 0),
+                    'revenue': revenue or 0.0,
+                    'days': days
+                }
+                for name, streams, revenue, days, _, _ in rows
+            }
             
-            return {
+            summary = {
                 'artist': artist_name,
-                'total_streams': sum(r.streams for r in analytics),
-                'total_revenue': round(sum(r.revenue for r in analytics), 2),
-                'total_records': len(analytics),
+                'total_streams': sum(d['streams'] for d in dsp_summary.values()),
+                'total_revenue': round(sum(d['revenue'] for d in dsp_summary.values()), 2),
+                'total_records': sum(d['days'] for d in dsp_summary.values()),
                 'dsps': dsp_summary,
                 'date_range': {
-                    'start': min(r.date for r in analytics).isoformat() if analytics else None,
-                    'end': max(r.date for r in analytics).isoformat() if analytics else None
+                    'start': min(row[4] for row in rows).isoformat(),
+                    'end': max(row[5] for row in rows).isoformat()
                 }
             }
+            summary_cache.put(cache_key, generation, summary)
+            return summary
             
         except Exception as e:
             logger.error(f"Erro ao obter resumo: {e}")
             return {'error': str(e)}
         finally:
             self.session.close()
+    
+    def get_artists_summary(self, artist_names: Optional[List[str]] = None, top_n: Optional[int] = None,
+                            order_by: str = 'streams') -> Dict:
+        """
+        Obtém o resumo por DSP de vários artistas em uma única consulta agrupada
+        
+        Args:
+            artist_names: Artistas incluídos; None = todos
+            top_n: Mantém apenas os N artistas com maior total
+            order_by: Total usado na ordenação (streams ou revenue)
+            
+        Returns:
+            Dicionário com a lista de resumos por artista, em ordem decrescente
+        """
+        if order_by not in ('streams', 'revenue'):
+            return {'error': f'Ordenação inválida: {order_by}'}
+        
+        try:
+            generation = get_data_generation(self.session)
+            cache_key = ('artists', tuple(sorted(artist_names or ())), top_n, order_by)
+            cached = summary_cache.get(cache_key, generation)
+            if cached is not None:
+                return cached
+            
+            # Artistas sem dados entram com totais zerados (LEFT JOIN nos rollups mensais)
+            query = self.session.query(
+                Artist.id,
+                Artist.name,
+                DSP.name,
+                func.sum(AnalyticsRollup.streams),
+                func.sum(AnalyticsRollup.revenue),
+                func.sum(AnalyticsRollup.days),
+                func.min(AnalyticsRollup.first_date),
+                func.max(AnalyticsRollup.last_date)
+            ).outerjoin(
+                AnalyticsRollup,
+                (AnalyticsRollup.artist_id == Artist.id) & (AnalyticsRollup.grain == 'month')
+            ).outerjoin(
+                DSP, AnalyticsRollup.dsp_id == DSP.id
+            )
+            if artist_names:
+                query = query.filter(Artist.name.in_(artist_names))
+            
+            if top_n is not None:
+                # Subconsulta com os N maiores totais, resolvida na mesma ida ao banco
+                metric = getattr(AnalyticsRollup, order_by)
+                top = self.session.query(Artist.id).outerjoin(
+                    AnalyticsRollup,
+                    (AnalyticsRollup.artist_id == Artist.id) & (AnalyticsRollup.grain == 'month')
+                )
+                if artist_names:
+                    top = top.filter(Artist.name.in_(artist_names))
+                top = top.group_by(Artist.id).order_by(
+                    func.coalesce(func.sum(metric), 0).desc(), Artist.name
+                ).limit(top_n)
+                query = query.filter(Artist.id.in_(top.scalar_subquery()))
+            
+            rows = query.group_by(Artist.id, Artist.name, AnalyticsRollup.dsp_id, DSP.name).all()
+            
+            artists = {}
+            for _, artist_name, dsp_name, streams, revenue, days, first_date, last_date in rows:
+                summary = artists.setdefault(artist_name, {
+                    'artist': artist_name,
+                    'total_streams': 0,
+                    'total_revenue': 0.0,
+                    'total_records': 0,
+                    'dsps': {},
+                    'date_range': {'start': None, 'end': None}
+                })
+                if dsp_name is None:
+                    continue
+                summary['dsps'][dsp_name] = {
+                    'streams': int(streams or 0),
+                    'revenue': revenue or 0.0,
+                    'days': days
+                }
+                summary['total_streams'] += int(streams or 0)
+                summary['total_revenue'] += revenue or 0.0
+                summary['total_records'] += days or 0
+                start, end = first_date.isoformat(), last_date.isoformat()
+                summary['date_range']['start'] = min(filter(None, (summary['date_range']['start'], start)))
+                summary['date_range']['end'] = max(filter(None, (summary['date_range']['end'], end)))
+            
+            for summary in artists.values():
+                summary['total_revenue'] = round(summary['total_revenue'], 2)
+            
+            total_key = f'total_{order_by}'
+            ranked = sorted(artists.values(), key=lambda a: (-a[total_key], a['artist']))
+            result = {
+                'count': len(ranked),
+                'order_by': order_by,
+                'artists': ranked
+            }
+            summary_cache.put(cache_key, generation, result)
+            return result
+            
+        except Exception as e:
+            logger.error(f"Erro ao obter resumo de artistas: {e}")
+            return {'error': str(e)}
+        finally:
+            self.session.close()
+    
+    def get_report_filters(self) -> Dict:
+        """
+        Lista os artistas e DSPs disponíveis para os filtros de relatório
+        
+        Returns:
+            Dicionário com listas de nomes de artistas e DSPs
+        """
+        try:
+            return {
+                'artists': [name for (name,) in self.session.query(Artist.name).order_by(Artist.name)],
+                'dsps': [name for (name,) in self.session.query(DSP.name).order_by(DSP.name)]
+            }
+        finally:
+            self.session.close()
+    
+    def get_analytics_report(self, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                             artist_names: Optional[List[str]] = None, dsps: Optional[List[str]] = None,
+                             grain: str = 'day') -> Dict:
+        """
+        Obtém resumo e série temporal dos analytics em um intervalo de datas
+        
+        Lê os rollups diários com uma varredura de intervalo no índice
+        (artist_id, grain, period_start); o custo acompanha o tamanho do
+        intervalo, não o histórico inteiro. O resultado fica em cache até a
+        próxima alteração dos dados.
+        
+        Args:
+            start_date: Data inicial (inclusive); None = sem limite
+            end_date: Data final (inclusive); None = sem limite
+            artist_names: Artistas incluídos; None = todos
+            dsps: Nomes canônicos dos DSPs incluídos; None = todos
+            grain: Agrupamento da série (day, week ou month)
+            
+        Returns:
+            Dicionário com totais, resumo por DSP e série por período/DSP
+        """
+        if grain not in ROLLUP_PERIOD_SQL:
+            return {'error': f'Granularidade inválida: {grain}'}
+        
+        try:
+            generation = get_data_generation(self.session)
+            cache_key = ('report', start_date, end_date, tuple(sorted(artist_names or ())),
+                         tuple(sorted(dsps or ())), grain)
+            cached = summary_cache.get(cache_key, generation)
+            if cached is not None:
+                return cached
+            
+            filters = self._daily_rollup_filters(start_date, end_date, artist_names, dsps)
+            
+            rows = self.session.query(
+                DSP.name,
+                func.sum(AnalyticsRollup.streams),
+                func.sum(AnalyticsRollup.revenue),
+                func.count(AnalyticsRollup.id),
+                func.min(AnalyticsRollup.period_start),
+                func.max(AnalyticsRollup.period_start)
+            ).join(
+                DSP, AnalyticsRollup.dsp_id == DSP.id
+            ).filter(*filters).group_by(AnalyticsRollup.dsp_id, DSP.name).all()
+            
+            period = literal_column(ROLLUP_PERIOD_SQL[grain].format(col='analytics_rollups.period_start'))
+            series = self.session.query(
+                period.label('period'),
+                DSP.name,
+                func.sum(AnalyticsRollup.streams),
+                func.sum(AnalyticsRollup.revenue)
+            ).join(
+                DSP, AnalyticsRollup.dsp_id == DSP.id
+            ).filter(*filters).group_by('period', DSP.name).order_by('period', DSP.name).all()
+            
+            dsp_summary = {
+                name: {
+                    'streams': int(streams or 0),
+                    'revenue': round(revenue or 0.0, 2),
+                    'days': days
+                }
+                for name, streams, revenue, days, _, _ in rows
+            }
+            
+            report = {
+                'artists': artist_names or 'all',
+                'start_date': start_date.isoformat() if start_date else None,
+                'end_date': end_date.isoformat() if end_date else None,
+                'total_streams': sum(d['streams'] for d in dsp_summary.values()),
+                'total_revenue': round(sum(d['revenue'] for d in dsp_summary.values()), 2),
+                'total_records': sum(d['days'] for d in dsp_summary.values()),
+                'dsps': dsp_summary,
+                'date_range': {
+                    'start': min(row[4] for row in rows).isoformat() if rows else None,
+                    'end': max(row[5] for row in rows).isoformat() if rows else None
+                },
+                'series': [
+                    {
+                        'period': str(period_start),
+                        'dsp': name,
+                        'streams': int(streams or 0),
+                        'revenue': round(revenue or 0.0, 2)
+                    }
+                    for period_start, name, streams, revenue in series
+                ]
+            }
+            summary_cache.put(cache_key, generation, report)
+            return report
+            
+        except Exception as e:
+            logger.error(f"Erro ao gerar relatório: {e}")
+            return {'error': str(e)}
+        finally:
+            self.session.close()
+    
+    def get_timeseries_matrix(self, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                              artist_names: Optional[List[str]] = None, dsps: Optional[List[str]] = None,
+                              metric: str = 'streams', grain: str = 'day', as_numpy: bool = False):
+        """
+        Retorna a série temporal densa período × DSP de uma métrica
+        
+        Os valores vêm de um único read_sql sobre os rollups diários, já
+        agregados por período e DSP no banco; períodos sem dados ficam com zero.
+        
+        Args:
+            start_date: Data inicial (inclusive); None = primeira data com dados
+            end_date: Data final (inclusive); None = última data com dados
+            artist_names: Artistas incluídos; None = todos
+            dsps: Nomes canônicos dos DSPs incluídos; None = todos
+            metric: streams ou revenue
+            grain: Agrupamento das linhas (day, week ou month)
+            as_numpy: Retorna arrays NumPy em vez de DataFrame
+            
+        Returns:
+            DataFrame com DatetimeIndex (início do período) e uma coluna por DSP,
+            ou, com as_numpy, tupla (valores 2D, datas, nomes dos DSPs)
+        """
+        if metric not in ('streams', 'revenue'):
+            raise ValueError(f"Métrica inválida: {metric}")
+        if grain not in ROLLUP_PERIOD_SQL:
+            raise ValueError(f"Granularidade inválida: {grain}")
+        
+        try:
+            generation = get_data_generation(self.session)
+            cache_key = ('matrix', start_date, end_date, tuple(sorted(artist_names or ())),
+                         tuple(sorted(dsps or ())), metric, grain)
+            matrix = summary_cache.get(cache_key, generation)
+            
+            if matrix is None:
+                period = literal_column(ROLLUP_PERIOD_SQL[grain].format(col='analytics_rollups.period_start'))
+                stmt = select(
+                    period.label('period'),
+                    DSP.name.label('dsp'),
+                    func.sum(getattr(AnalyticsRollup, metric)).label('value')
+                ).join(
+                    DSP, AnalyticsRollup.dsp_id == DSP.id
+                ).where(
+                    *self._daily_rollup_filters(start_date, end_date, artist_names, dsps)
+                ).group_by('period', DSP.name)
+                
+                long_df = pd.read_sql(stmt, self.session.connection(), parse_dates=['period'])
+                matrix = long_df.pivot(index='period', columns='dsp', values='value')
+                
+                # Índice denso: todos os períodos do intervalo, mesmo sem dados. Um limite
+                # aberto sem dados no intervalo (NaT) resulta em matriz vazia
+                freq = {'day': 'D', 'week': 'W-MON', 'month': 'MS'}[grain]
+                first = pd.Timestamp(period_bounds(grain, start_date, start_date)[0]) if start_date else matrix.index.min()
+                last = pd.Timestamp(end_date) if end_date else matrix.index.max()
+                if pd.notna(first) and pd.notna(last):
+                    index = pd.date_range(first, last, freq=freq, name='period')
+                else:
+                    index = pd.DatetimeIndex([], name='period')
+                
+                matrix = matrix.reindex(index, fill_value=0).fillna(0).sort_index(axis=1)
+                matrix.columns.name = 'dsp'
+                matrix = matrix.astype('int64' if metric == 'streams' else 'float64')
+                summary_cache.put(cache_key, generation, matrix)
+            
+            if as_numpy:
+                return matrix.to_numpy(), matrix.index.to_numpy(), matrix.columns.tolist()
+            return matrix
+        finally:
+            self.session.close()
+    
+    def _daily_rollup_filters(self, start_date: Optional[date], end_date: Optional[date],
+                              artist_names: Optional[List[str]], dsps: Optional[List[str]]) -> list:
+        """Monta os filtros de intervalo, artista e DSP sobre os rollups diários"""
+        artists = self.session.query(Artist.id)
+        if artist_names:
+            artists = artists.filter(Artist.name.in_(artist_names))
+        artist_ids = [artist_id for (artist_id,) in artists]
+        
+        filters = [AnalyticsRollup.grain == 'day', AnalyticsRollup.artist_id.in_(artist_ids)]
+        if start_date is not None:
+            filters.append(AnalyticsRollup.period_start >= start_date)
+        if end_date is not None:
+            filters.append(AnalyticsRollup.period_start <= end_date)
+        if dsps:
+            filters.append(DSP.name.in_(dsps))
+        return filters
 
 
 # Teste direto do processador
@@ -0,0 +1,201 @@
+"""
+Importação em lote de vários CSVs de Analytics/Streams
+
+Os arquivos são lidos e validados em paralelo em um pool de processos e os
+registros normalizados são enviados para um único escritor no processo
+principal, evitando disputa pelo lock de escrita do SQLite. A gravação segue
+a ordem dos nomes dos arquivos, independente de qual leitura termina antes.
+
+Uso:
+    python -m src.csv_processors.batch_importer data/csv --artist AllMark
+"""
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import glob
+import logging
+import os
+import sys
+
+# Adiciona o diretório pai ao path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.csv_processors.analytics_processor import AnalyticsCSVProcessor
+from src.database.models import Artist, CSVImport
+
+logger = logging.getLogger(__name__)
+
+# Padrão dos arquivos exportados pelas distribuidoras
+DEFAULT_PATTERN = "Analytics-Streams-by-Dsp-*.csv"
+
+
+def _parse_file(filepath: str, year: Optional[int] = None) -> Dict:
+    """Lê e normaliza um arquivo no processo worker"""
+    try:
+        return AnalyticsCSVProcessor.parse_analytics_file(filepath, year)
+    except Exception as e:
+        return {'file': Path(filepath).name, 'error': str(e)}
+
+
+class BatchAnalyticsImporter:
+    """Importador de vários CSVs de analytics com leitura paralela e escritor único"""
+    
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Args:
+            max_workers: Número de processos de leitura (padrão: número de CPUs)
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+    
+    def find_files(self, source: str, pattern: str = DEFAULT_PATTERN) -> List[Path]:
+        """
+        Resolve um diretório ou padrão glob para a lista de arquivos
+        
+        Args:
+            source: Diretório ou padrão glob (ex: "data/csv/*.csv")
+            pattern: Padrão usado quando source é um diretório
+            
+        Returns:
+            Lista ordenada de arquivos encontrados
+        """
+        path = Path(source)
+        if path.is_dir():
+            return sorted(path.glob(pattern))
+        return sorted(Path(p) for p in glob.glob(source) if Path(p).is_file())
+    
+    def import_files(self, source: str, artist_name: str = "AllMark",
+                     pattern: str = DEFAULT_PATTERN, year: Optional[int] = None,
+                     delta: bool = False) -> Dict:
+        """
+        Importa todos os arquivos de um diretório ou padrão glob
+        
+        Args:
+            source: Diretório ou padrão glob
+            artist_name: Nome do artista
+            pattern: Padrão usado quando source é um diretório
+            year: Ano da primeira coluna de data; se None, é inferido de cada arquivo
+            delta: Compara com os dados gravados e grava apenas novos/alterados
+            
+        Returns:
+            Dicionário com o resultado de cada arquivo e totais
+        """
+        files = self.find_files(source, pattern)
+        logger.info(f"{len(files)} arquivos encontrados em {source}")
+        
+        results = []
+        writer = AnalyticsCSVProcessor()
+        
+        try:
+            artist = writer._get_or_create_artist(artist_name)
+            
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                # Calcula o hash de todos os arquivos antes de ler o conteúdo
+                hashes = list(pool.map(AnalyticsCSVProcessor.file_hash, [str(f) for f in files]))
+                
+                futures = {}
+                seen = {}
+                for filepath, content_hash in zip(files, hashes):
+                    duplicate = writer.find_duplicate_import(content_hash, artist.id, year)
+                    if duplicate:
+                        results.append(writer._duplicate_result(filepath.name, artist_name, duplicate))
+                    elif content_hash in seen:
+                        results.append({
+                            'status': 'duplicate',
+                            'file': filepath.name,
+                            'artist': artist_name,
+                            'message': f"Conteúdo idêntico a '{seen[content_hash]}' neste lote"
+                        })
+                    else:
+                        seen[content_hash] = filepath.name
+                        future = pool.submit(_parse_file, str(filepath), year)
+                        futures[future] = (filepath, content_hash)
+                
+                # Leitura em paralelo, gravação na ordem dos arquivos: quando exportações
+                # sobrepostas divergem, prevalece sempre o arquivo posterior na ordem
+                for future in futures:
+                    filepath, content_hash = futures[future]
+                    results.append(self._write(writer, future.result(), artist, filepath, content_hash, year, delta))
+        finally:
+            writer.session.close()
+        
+        succeeded = [r for r in results if r['status'] == 'success']
+        failed = [r for r in results if r['status'] == 'error']
+        return {
+            'status': 'success' if not failed else 'partial',
+            'files': len(results),
+            'files_success': len(succeeded),
+            'files_duplicate': len(results) - len(succeeded) - len(failed),
+            'files_error': len(failed),
+            'rows_success': sum(r['rows_success'] for r in succeeded),
+            'rows_written': sum(r['rows_written'] for r in succeeded),
+            'rows_unchanged': sum(r['rows_unchanged'] for r in succeeded),
+            'total_streams': sum(r['total_streams'] for r in succeeded),
+            'results': results
+        }
+    
+    def _write(self, writer: AnalyticsCSVProcessor, parsed: Dict, artist: Artist,
+               filepath: Path, content_hash: str, year: Optional[int] = None,
+               delta: bool = False) -> Dict:
+        """Grava um arquivo normalizado usando a sessão do escritor único"""
+        import_record = CSVImport(
+            filename=parsed['file'],
+            distributor="general",
+            import_type="analytics",
+            status="processing",
+            artist_id=artist.id,
+            content_hash=content_hash,
+            file_size=filepath.stat().st_size,
+            data_year=year
+        )
+        writer.session.add(import_record)
+        writer.session.commit()
+        
+        try:
+            if 'error' in parsed:
+                raise ValueError(parsed['error'])
+            return writer.save_parsed_analytics(parsed, artist.name, import_record, delta)
+            
+        except Exception as e:
+            logger.error(f"Erro no processamento de {parsed['file']}: {e}")
+            writer.session.rollback()
+            
+            # Atualiza registro de importação com erro
+            import_record.status = "error"
+            import_record.error_message = str(e)
+            writer.session.commit()
+            
+            return {
+                'status': 'error',
+                'file': parsed['file'],
+                'message': str(e)
+            }
+
+
+def main():
+    """Ponto de entrada da linha de comando"""
+    parser = argparse.ArgumentParser(description="Importa vários CSVs de analytics de uma vez")
+    parser.add_argument("source", help="Diretório ou padrão glob dos arquivos CSV")
+    parser.add_argument("--artist", default="AllMark", help="Nome do artista")
+    parser.add_argument("--pattern", default=DEFAULT_PATTERN, help="Padrão de arquivos dentro do diretório")
+    parser.add_argument("--workers", type=int, default=None, help="Número de processos de leitura")
+    parser.add_argument("--year", type=int, default=None, help="Ano da primeira coluna de data")
+    parser.add_argument("--delta", action="store_true", help="Grava apenas células novas ou alteradas")
+    args = parser.parse_args()
+    
+    importer = BatchAnalyticsImporter(max_workers=args.workers)
+    summary = importer.import_files(args.source, args.artist, args.pattern, args.year, args.delta)
+    
+    print(f"\n{summary['files_success']}/{summary['files']} arquivos importados")
+    print(f"   - Arquivos já importados: {summary['files_duplicate']}")
+    print(f"   - Registros válidos: {summary['rows_success']}")
+    print(f"   - Registros gravados: {summary['rows_written']}")
+    print(f"   - Registros inalterados: {summary['rows_unchanged']}")
+    print(f"   - Total de Streams: {summary['total_streams']:,}")
+    for result in summary['results']:
+        if result['status'] == 'error':
+            print(f"   ❌ {result['file']}: {result['message']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Cache de resumos e relatórios de analytics compartilhado pelo processo
+
+Cada resultado é guardado com a geração dos dados em que foi calculado
+(tabela data_generation). Importações e limpezas incrementam a geração, e
+qualquer entrada de uma geração anterior é tratada como ausente.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import copy
+import threading
+
+
+class SummaryCache:
+    """Cache LRU de resultados indexado por (chave, geração dos dados)"""
+    
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Hashable, generation: int) -> Optional[Any]:
+        """
+        Busca um resultado calculado na geração informada
+        
+        Args:
+            key: Chave do resultado (artista, filtros)
+            generation: Geração atual dos dados
+        
+        Returns:
+            Cópia do resultado em cache ou None se ausente/desatualizado
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != generation:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+    
+    def put(self, key: Hashable, generation: int, value: Any) -> None:
+        """Guarda um resultado calculado na geração informada"""
+        with self._lock:
+            self._entries[key] = (generation, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self) -> None:
+        """Remove todas as entradas e zera os contadores"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self) -> Dict:
+        """Retorna acertos, falhas, taxa de acerto e tamanho do cache"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries
+            }
+
+
+# Instância única usada por todos os processadores do processo
+summary_cache = SummaryCache()
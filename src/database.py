@@ -1,24 +1,410 @@
 import sqlite3
+import argparse
+import atexit
 import os
-from datetime import datetime
-from typing import Dict, List, Any, Optional
+import queue
+import sys
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+
+# Adiciona o diretório raiz ao path (sqlite_config), também ao rodar como script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database.sqlite_config import SQLITE_PRAGMAS
+
+# Tamanho do cache de comandos preparados de cada conexão
+STATEMENT_CACHE_SIZE = 256
+
+# Músicas gravadas por executemany em save_tracks
+SAVE_TRACKS_BATCH_SIZE = 5000
+
+# Gravação em segundo plano de api_logs
+API_LOG_BATCH_SIZE = 500
+API_LOG_FLUSH_INTERVAL_MS = 250
+API_LOG_MAX_QUEUE = 10000
+
+INSERT_API_LOG_SQL = '''
+    INSERT INTO api_logs
+    (distributor, endpoint, method, status_code,
+     response_time_ms, error_message, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Retenção: idade máxima das linhas brutas antes de virarem agregados
+API_LOG_RETENTION_DAYS = int(os.getenv('API_LOG_RETENTION_DAYS', '7'))
+API_LOG_ROLLUP_GRAIN = os.getenv('API_LOG_ROLLUP_GRAIN', 'hour')
+SYNC_HISTORY_RETENTION_DAYS = int(os.getenv('SYNC_HISTORY_RETENTION_DAYS', '30'))
+RETENTION_BATCH_SIZE = 5000
+
+# Formato de truncamento de created_at por granularidade dos agregados de api_logs
+API_LOG_ROLLUP_GRAINS = {
+    'minute': '%Y-%m-%d %H:%M:00',
+    'hour': '%Y-%m-%d %H:00:00',
+}
+
+# Duração de um balde de api_log_rollups por granularidade
+API_LOG_ROLLUP_STEPS = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+}
+
+# Contagens, soma, mínimo e máximo de cada (distribuidora, endpoint) de um balde
+# ainda não consolidado; os percentis são calculados à parte, sobre a lista
+# completa de latências do balde
+SELECT_API_LOG_BUCKET_SQL = '''
+    SELECT l.distributor, l.endpoint, COUNT(*),
+           SUM(l.error_message IS NOT NULL OR COALESCE(l.status_code, 0) >= 400),
+           COUNT(l.response_time_ms), COALESCE(SUM(l.response_time_ms), 0),
+           MIN(l.response_time_ms), MAX(l.response_time_ms)
+    FROM api_logs l
+    WHERE l.created_at >= :start AND l.created_at < :end
+      AND NOT EXISTS (
+          SELECT 1 FROM api_log_rollups r
+          WHERE r.grain = :grain AND r.bucket_start = :start
+            AND r.distributor = l.distributor AND r.endpoint = l.endpoint
+      )
+    GROUP BY l.distributor, l.endpoint
+'''
+
+INSERT_API_LOG_ROLLUP_SQL = '''
+    INSERT INTO api_log_rollups
+    (grain, bucket_start, distributor, endpoint, calls, errors,
+     latency_count, latency_sum, latency_min, latency_max,
+     latency_p50, latency_p95, latency_p99)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Colunas que os leitores paginados podem projetar
+TRACK_COLUMNS = ('isrc', 'title', 'artist', 'album', 'distributor',
+                 'duration', 'genre', 'release_date', 'territory', 'status')
+UPLOAD_COLUMNS = ('filename', 'distributor', 'rows_count', 'status', 'uploaded_by', 'created_at')
+SYNC_COLUMNS = ('distributor', 'sync_type', 'source', 'status',
+                'records_processed', 'records_success', 'records_failed',
+                'started_at', 'completed_at')
+
+# Busca textual no catálogo: índice FTS5 de conteúdo externo sobre tracks.
+# Os gatilhos mantêm o índice a cada INSERT/DELETE e nos UPDATEs que mudam
+# título, artista ou álbum (o upsert de save_tracks regrava todas as colunas).
+# Sem índices de prefixo (prefix=...): dobram o custo de escrita e a busca
+# por prefixo já responde em milissegundos sem eles.
+TRACKS_FTS_TABLE_SQL = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5(
+        title, artist, album,
+        content='tracks', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+'''
+
+TRACKS_FTS_TRIGGERS = {
+    'tracks_fts_insert': '''
+    CREATE TRIGGER IF NOT EXISTS tracks_fts_insert AFTER INSERT ON tracks BEGIN
+        INSERT INTO tracks_fts (rowid, title, artist, album)
+        VALUES (new.id, new.title, new.artist, new.album);
+    END
+    ''',
+    'tracks_fts_delete': '''
+    CREATE TRIGGER IF NOT EXISTS tracks_fts_delete AFTER DELETE ON tracks BEGIN
+        INSERT INTO tracks_fts (tracks_fts, rowid, title, artist, album)
+        VALUES ('delete', old.id, old.title, old.artist, old.album);
+    END
+    ''',
+    'tracks_fts_update': '''
+    CREATE TRIGGER IF NOT EXISTS tracks_fts_update AFTER UPDATE OF title, artist, album ON tracks
+    WHEN old.title IS NOT new.title OR old.artist IS NOT new.artist OR old.album IS NOT new.album
+    BEGIN
+        INSERT INTO tracks_fts (tracks_fts, rowid, title, artist, album)
+        VALUES ('delete', old.id, old.title, old.artist, old.album);
+        INSERT INTO tracks_fts (rowid, title, artist, album)
+        VALUES (new.id, new.title, new.artist, new.album);
+    END
+    ''',
+}
+
+# Pesos do bm25 por coluna do índice (título, artista, álbum)
+TRACKS_FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Cursor de paginação por chave: (valor da coluna de ordenação, id)
+Cursor = Tuple[Any, int]
+
+# Upsert por ISRC: preserva id e created_at das músicas já cadastradas
+UPSERT_TRACK_SQL = '''
+    INSERT INTO tracks
+    (isrc, title, artist, album, distributor, duration,
+     genre, release_date, territory, status, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(isrc) DO UPDATE SET
+        title = excluded.title,
+        artist = excluded.artist,
+        album = excluded.album,
+        distributor = excluded.distributor,
+        duration = excluded.duration,
+        genre = excluded.genre,
+        release_date = excluded.release_date,
+        territory = excluded.territory,
+        status = excluded.status,
+        updated_at = excluded.updated_at
+'''
+
+class _ThreadToken:
+    """Objeto guardado no threading.local; é coletado quando a thread termina"""
+
+
+class ApiLogWriter:
+    """
+    Grava os logs de chamadas à API em lotes a partir de uma thread própria
+    
+    log() apenas enfileira a linha em uma fila limitada; a thread grava um lote
+    com executemany a cada batch_size linhas ou flush_interval_ms. Com a fila
+    cheia, a linha é descartada e contada em dropped, sem bloquear quem chamou.
+    A retenção (Database.apply_retention) não roda nesta thread: um expurgo
+    longo deixaria a fila sem consumidor. Ela é agendada à parte, pela linha
+    de comando (python src/database.py --retention, via cron).
+    """
+    
+    def __init__(self, db: 'Database', batch_size: int = API_LOG_BATCH_SIZE,
+                 flush_interval_ms: int = API_LOG_FLUSH_INTERVAL_MS,
+                 max_queue: int = API_LOG_MAX_QUEUE):
+        """
+        Args:
+            db: Banco onde os logs são gravados
+            batch_size: Linhas por lote
+            flush_interval_ms: Tempo máximo que uma linha espera na fila
+            max_queue: Capacidade da fila antes de descartar
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        # log() é chamado de várias threads; os contadores de written, batches
+        # e errors só mudam na thread do escritor
+        self._counters_lock = threading.Lock()
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="api-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def log(self, row: Tuple) -> bool:
+        """
+        Enfileira uma linha de api_logs
+        
+        Returns:
+            False se a linha foi descartada por falta de espaço na fila
+        """
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._counters_lock:
+                self.dropped += 1
+            return False
+        with self._counters_lock:
+            self.submitted += 1
+        return True
+    
+    def flush(self) -> None:
+        """Aguarda a gravação de tudo que já foi enfileirado"""
+        self._queue.join()
+    
+    def close(self) -> None:
+        """Grava o que restou na fila e encerra a thread (também chamado no atexit)"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        atexit.unregister(self.close)
+    
+    def stats(self) -> Dict[str, int]:
+        """Retorna os contadores do escritor"""
+        with self._counters_lock:
+            submitted, dropped = self.submitted, self.dropped
+        return {
+            'submitted': submitted,
+            'written': self.written,
+            'dropped': dropped,
+            'batches': self.batches,
+            'errors': self.errors,
+            'queued': self._queue.qsize()
+        }
+    
+    def _run(self) -> None:
+        """Laço da thread: junta linhas até encher o lote ou vencer o intervalo"""
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=min(timeout, 0.05)))
+                except queue.Empty:
+                    if self._stop.is_set():
+                        break
+            if batch:
+                self._write(batch)
+    
+    def _write(self, batch: List[Tuple]) -> None:
+        """Grava um lote em uma única transação"""
+        try:
+            with self.db.transaction() as conn:
+                conn.executemany(INSERT_API_LOG_SQL, batch)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            # Qualquer falha só perde o lote: a thread continua esvaziando a fila
+            self.errors += 1
+            print(f"Erro ao gravar logs da API ({len(batch)} linhas): {e}")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
 
 class Database:
     """Classe para gerenciar o banco de dados SQLite"""
     
-    def __init__(self, db_path: str = "data/database.db"):
-        """Inicializa a conexão com o banco de dados"""
+    def __init__(self, db_path: str = "data/database.db", pragmas: Optional[Dict[str, Any]] = None,
+                 async_api_logs: bool = True):
+        """
+        Inicializa a conexão com o banco de dados
+        
+        Args:
+            db_path: Caminho do arquivo SQLite
+            pragmas: PRAGMAs que substituem os de config.SQLITE_PRAGMAS
+            async_api_logs: Grava log_api_call em segundo plano (ApiLogWriter)
+        """
         self.db_path = db_path
+        self.pragmas = {**SQLITE_PRAGMAS, **(pragmas or {})}
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self.last_save_errors: List[Dict[str, Any]] = []
+        self.async_api_logs = async_api_logs
+        self._api_log_writer: Optional[ApiLogWriter] = None
+        self.has_fts = False
         self._create_tables()
     
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Retorna a conexão da thread atual, abrindo-a na primeira chamada
+        
+        Cada thread reaproveita a sua conexão, e o cache de comandos do sqlite3
+        reaproveita os comandos preparados entre chamadas com o mesmo SQL.
+        Quando a thread termina, o seu threading.local é descartado e a conexão
+        é fechada (weakref.finalize), então servidores com threads de vida curta
+        não acumulam conexões abertas.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=self.pragmas.get('busy_timeout', 5000) / 1000,
+                cached_statements=STATEMENT_CACHE_SIZE,
+                check_same_thread=False
+            )
+            for pragma, value in self.pragmas.items():
+                conn.execute(f"PRAGMA {pragma} = {value}")
+            self._local.conn = conn
+            self._local.depth = 0
+            self._local.token = _ThreadToken()
+            weakref.finalize(self._local.token, self._release_connection,
+                             self._connections, self._connections_lock, conn)
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    @staticmethod
+    def _release_connection(connections: List[sqlite3.Connection], lock: threading.Lock,
+                            conn: sqlite3.Connection) -> None:
+        """Fecha a conexão de uma thread encerrada e a remove da lista de conexões"""
+        with lock:
+            if conn in connections:
+                connections.remove(conn)
+        conn.close()
+    
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Agrupa várias operações em um único commit
+        
+        Transações aninhadas na mesma thread participam da mais externa: o
+        commit (ou rollback, em caso de exceção) acontece apenas na saída dela.
+        
+        Exemplo:
+            with db.transaction():
+                db.log_sync(...)
+                db.update_csv_status(...)
+        """
+        conn = self._connection()
+        self._local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.rollback()
+            raise
+        else:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.commit()
+    
+    def close(self) -> None:
+        """Grava os logs pendentes e fecha as conexões abertas por todas as threads"""
+        if self._api_log_writer is not None:
+            self._api_log_writer.close()
+            self._api_log_writer = None
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+    
     def _create_tables(self):
         """Cria as tabelas necessárias no banco de dados"""
         # Cria o diretório data se não existir
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
         
-        # Conecta ao banco
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.transaction() as conn:
+            self._create_schema(conn.cursor())
+            self.has_fts = self._create_search_index(conn.cursor())
+    
+    def _create_search_index(self, cursor: sqlite3.Cursor) -> bool:
+        """
+        Cria o índice FTS5 do catálogo e os gatilhos que o mantêm
+        
+        Na primeira criação o índice é preenchido com as músicas existentes.
+        
+        Returns:
+            False se o SQLite não foi compilado com FTS5 (a busca usa LIKE)
+        """
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tracks_fts'"
+        ).fetchone()
+        try:
+            cursor.execute("SAVEPOINT tracks_fts_schema")
+            cursor.execute(TRACKS_FTS_TABLE_SQL)
+            for statement in TRACKS_FTS_TRIGGERS.values():
+                cursor.execute(statement)
+            cursor.execute("RELEASE tracks_fts_schema")
+        except sqlite3.OperationalError as e:
+            cursor.execute("ROLLBACK TO tracks_fts_schema")
+            cursor.execute("RELEASE tracks_fts_schema")
+            print(f"Busca textual indisponível (FTS5): {e}")
+            return False
+        if not exists:
+            cursor.execute("INSERT INTO tracks_fts (tracks_fts) VALUES ('rebuild')")
+        return True
+    
+    def _create_schema(self, cursor: sqlite3.Cursor):
+        """Executa os CREATE TABLE do esquema"""
         
         # Tabela de usuários
         cursor.execute('''
@@ -99,79 +485,117 @@ class Database:
             )
         ''')
         
-        # Salva as mudanças
-        conn.commit()
-        conn.close()
+        # Agregados de api_logs por minuto/hora, distribuidora e endpoint
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS api_log_rollups (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                grain TEXT NOT NULL,
+                bucket_start TIMESTAMP NOT NULL,
+                distributor TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                calls INTEGER NOT NULL DEFAULT 0,
+                errors INTEGER NOT NULL DEFAULT 0,
+                latency_count INTEGER NOT NULL DEFAULT 0,
+                latency_sum INTEGER NOT NULL DEFAULT 0,
+                latency_min INTEGER,
+                latency_max INTEGER,
+                latency_p50 REAL,
+                latency_p95 REAL,
+                latency_p99 REAL,
+                UNIQUE (grain, bucket_start, distributor, endpoint)
+            )
+        ''')
+        
+        # Agregados diários de sync_history por distribuidora
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_history_daily (
+                day DATE NOT NULL,
+                distributor TEXT NOT NULL,
+                runs INTEGER NOT NULL DEFAULT 0,
+                failed_runs INTEGER NOT NULL DEFAULT 0,
+                records_processed INTEGER NOT NULL DEFAULT 0,
+                records_success INTEGER NOT NULL DEFAULT 0,
+                records_failed INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, distributor)
+            )
+        ''')
+        
+        # Índices das consultas por período e da paginação por chave; no SQLite o
+        # índice já termina no rowid (id), cobrindo o cursor (created_at, id).
+        # sync_history não tem created_at; o período usa started_at
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_tracks_created_at ON tracks (created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_tracks_distributor ON tracks (distributor)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_csv_uploads_created_at ON csv_uploads (created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_csv_uploads_status ON csv_uploads (status)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_sync_history_started_at ON sync_history (started_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_api_logs_created_at ON api_logs (created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_api_log_rollups_bucket ON api_log_rollups (bucket_start)")
     
     def get_statistics(self) -> Dict[str, Any]:
-        """Retorna estatísticas gerais do sistema"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """
+        Retorna estatísticas gerais do sistema
+        
+        Usa três consultas agregadas com intervalos semiabertos de data
+        (coluna >= início AND coluna < fim), atendidas pelos índices de
+        created_at/started_at em vez de varrer as tabelas.
+        """
+        cursor = self._connection().cursor()
+        
+        # Limites em UTC, no mesmo formato de CURRENT_TIMESTAMP
+        now = datetime.utcnow()
+        today = now.strftime('%Y-%m-%d')
+        tomorrow = (now + timedelta(days=1)).strftime('%Y-%m-%d')
+        week_ago = (now - timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')
+        two_weeks_ago = (now - timedelta(days=14)).strftime('%Y-%m-%d %H:%M:%S')
         
         stats = {}
         
         try:
-            # Total de músicas
-            cursor.execute("SELECT COUNT(*) FROM tracks")
-            stats['total_tracks'] = cursor.fetchone()[0]
-            
-            # Músicas por distribuidora
+            # Músicas por distribuidora (varredura do índice de distributor)
             cursor.execute("""
                 SELECT distributor, COUNT(*) 
                 FROM tracks 
                 GROUP BY distributor
             """)
-            for row in cursor.fetchall():
-                stats[f'{row[0].lower()}_tracks'] = row[1]
+            stats = {'total_tracks': 0, 'fuga_tracks': 0, 'orchard_tracks': 0, 'vydia_tracks': 0}
+            for distributor, count in cursor.fetchall():
+                stats[f'{distributor.lower()}_tracks'] = count
+                stats['total_tracks'] += count
             
-            # Músicas adicionadas hoje
+            # Músicas e CSVs de hoje, CSVs concluídos
             cursor.execute("""
-                SELECT COUNT(*) FROM tracks 
-                WHERE DATE(created_at) = DATE('now')
-            """)
-            stats['new_tracks_today'] = cursor.fetchone()[0]
-            
-            # Total de CSVs processados
-            cursor.execute("SELECT COUNT(*) FROM csv_uploads WHERE status = 'completed'")
-            result = cursor.fetchone()
-            stats['total_csv_files'] = result[0] if result else 0
+                SELECT
+                    (SELECT COUNT(*) FROM tracks
+                     WHERE created_at >= :today AND created_at < :tomorrow),
+                    (SELECT COUNT(*) FROM csv_uploads WHERE status = 'completed'),
+                    (SELECT COUNT(*) FROM csv_uploads
+                     WHERE created_at >= :today AND created_at < :tomorrow)
+            """, {'today': today, 'tomorrow': tomorrow})
+            stats['new_tracks_today'], stats['total_csv_files'], stats['csv_files_today'] = cursor.fetchone()
             
-            # CSVs processados hoje
+            # Taxa de sucesso das sincronizações: últimos 7 dias e semana anterior em uma passada.
+            # Dias já expurgados pela retenção vêm de sync_history_daily (precisão de dia)
             cursor.execute("""
-                SELECT COUNT(*) FROM csv_uploads 
-                WHERE DATE(created_at) = DATE('now')
-            """)
-            result = cursor.fetchone()
-            stats['csv_files_today'] = result[0] if result else 0
+                SELECT
+                    SUM(CASE WHEN ts >= :week_ago THEN processed END),
+                    SUM(CASE WHEN ts >= :week_ago THEN success END),
+                    SUM(CASE WHEN ts < :week_ago THEN processed END),
+                    SUM(CASE WHEN ts < :week_ago THEN success END)
+                FROM (
+                    SELECT started_at AS ts, records_processed AS processed, records_success AS success
+                    FROM sync_history
+                    WHERE started_at >= :two_weeks_ago
+                    UNION ALL
+                    SELECT day, records_processed, records_success
+                    FROM sync_history_daily
+                    WHERE day >= :two_weeks_ago_day
+                )
+            """, {'week_ago': week_ago, 'two_weeks_ago': two_weeks_ago,
+                  'two_weeks_ago_day': two_weeks_ago[:10]})
+            processed, success, old_processed, old_success = cursor.fetchone()
             
-            # Taxa de sucesso das sincronizações (últimos 7 dias)
-            cursor.execute("""
-                SELECT 
-                    CASE 
-                        WHEN SUM(records_processed) > 0 
-                        THEN CAST(SUM(records_success) AS FLOAT) / SUM(records_processed) * 100
-                        ELSE 98.5
-                    END
-                FROM sync_history
-                WHERE created_at >= datetime('now', '-7 days')
-            """)
-            result = cursor.fetchone()[0]
-            stats['success_rate'] = result if result else 98.5
-            
-            # Delta da taxa de sucesso (comparando com semana anterior)
-            cursor.execute("""
-                SELECT 
-                    CASE 
-                        WHEN SUM(records_processed) > 0 
-                        THEN CAST(SUM(records_success) AS FLOAT) / SUM(records_processed) * 100
-                        ELSE 96.4
-                    END
-                FROM sync_history
-                WHERE created_at >= datetime('now', '-14 days')
-                AND created_at < datetime('now', '-7 days')
-            """)
-            result = cursor.fetchone()[0]
-            old_rate = result if result else 96.4
+            stats['success_rate'] = success / processed * 100 if processed else 98.5
+            old_rate = old_success / old_processed * 100 if old_processed else 96.4
             stats['success_rate_delta'] = stats['success_rate'] - old_rate
             
         except Exception as e:
@@ -189,190 +613,603 @@ class Database:
                 'success_rate_delta': 2.1
             }
         
-        conn.close()
         return stats
     
-    def save_tracks(self, tracks: List[Dict], distributor: str) -> int:
-        """Salva músicas no banco de dados"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def save_tracks(self, tracks: List[Dict], distributor: str,
+                    batch_size: int = SAVE_TRACKS_BATCH_SIZE) -> int:
+        """
+        Salva músicas no banco de dados em lotes
+        
+        Cada lote é gravado com um único executemany de INSERT ... ON CONFLICT(isrc)
+        DO UPDATE, que mantém id e created_at das músicas já cadastradas. Um lote
+        com erro é desfeito por inteiro (savepoint) e registrado em
+        last_save_errors; os demais lotes seguem normalmente.
+        
+        Cargas com pelo menos tantas músicas quanto as já cadastradas suspendem
+        os gatilhos da busca textual e reconstroem o índice FTS5 de uma vez no
+        fim da mesma transação, o que é bem mais rápido que indexar linha a linha.
+        
+        Args:
+            tracks: Lista de dicionários com os dados das músicas
+            distributor: Nome da distribuidora
+            batch_size: Quantidade de músicas por lote
+            
+        Returns:
+            Quantidade de músicas salvas
+        """
+        now = datetime.now()
+        rows = [
+            (
+                track.get('isrc', ''),
+                track.get('title', 'Unknown'),
+                track.get('artist', 'Unknown'),
+                track.get('album', ''),
+                distributor,
+                track.get('duration', ''),
+                track.get('genre', ''),
+                track.get('release_date'),
+                track.get('territory', 'WW'),
+                track.get('status', 'active'),
+                now
+            )
+            for track in tracks
+        ]
         
         saved_count = 0
+        self.last_save_errors = []
+        
+        with self.transaction() as conn:
+            # Garante uma transação aberta para que os savepoints não façam commit sozinhos
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            
+            bulk_index = self.has_fts and len(rows) >= conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+            if bulk_index:
+                for name in TRACKS_FTS_TRIGGERS:
+                    conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+            
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                conn.execute("SAVEPOINT save_tracks_batch")
+                try:
+                    conn.executemany(UPSERT_TRACK_SQL, batch)
+                    conn.execute("RELEASE SAVEPOINT save_tracks_batch")
+                    saved_count += len(batch)
+                except sqlite3.Error as e:
+                    conn.execute("ROLLBACK TO SAVEPOINT save_tracks_batch")
+                    conn.execute("RELEASE SAVEPOINT save_tracks_batch")
+                    self.last_save_errors.append({
+                        'batch': start // batch_size,
+                        'first_row': start,
+                        'rows': len(batch),
+                        'error': str(e)
+                    })
+                    print(f"Erro ao salvar lote de músicas {start}-{start + len(batch) - 1}: {e}")
+            
+            if bulk_index:
+                for statement in TRACKS_FTS_TRIGGERS.values():
+                    conn.execute(statement)
+                conn.execute("INSERT INTO tracks_fts (tracks_fts) VALUES ('rebuild')")
         
-        for track in tracks:
-            try:
-                cursor.execute('''
-                    INSERT OR REPLACE INTO tracks 
-                    (isrc, title, artist, album, distributor, duration, 
-                     genre, release_date, territory, status, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    track.get('isrc', ''),
-                    track.get('title', 'Unknown'),
-                    track.get('artist', 'Unknown'),
-                    track.get('album', ''),
-                    distributor,
-                    track.get('duration', ''),
-                    track.get('genre', ''),
-                    track.get('release_date'),
-                    track.get('territory', 'WW'),
-                    track.get('status', 'active'),
-                    datetime.now()
-                ))
-                saved_count += 1
-            except Exception as e:
-                print(f"Erro ao salvar música: {e}")
-                continue
-        
-        conn.commit()
-        conn.close()
         return saved_count
     
     def get_all_tracks(self) -> List[Dict]:
         """Retorna todas as músicas cadastradas"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        return list(self.iter_tracks())
+    
+    def iter_tracks(self, columns: Optional[List[str]] = None, batch_size: int = 1000,
+                    after: Optional[Cursor] = None) -> Iterator[Dict]:
+        """
+        Percorre as músicas da mais recente para a mais antiga em lotes
         
-        cursor.execute("""
-            SELECT isrc, title, artist, album, distributor, 
-                   duration, genre, release_date, territory, status
-            FROM tracks
-            ORDER BY created_at DESC
-        """)
+        Args:
+            columns: Colunas retornadas (padrão: TRACK_COLUMNS)
+            batch_size: Linhas lidas por consulta
+            after: Cursor (created_at, id) a partir do qual continuar
+            
+        Yields:
+            Dicionário por música
+        """
+        for row, _ in self._iter_keyset('tracks', TRACK_COLUMNS, columns, 'created_at', batch_size, after):
+            yield row
+    
+    def get_tracks_page(self, limit: int = 50, after: Optional[Cursor] = None,
+                        columns: Optional[List[str]] = None) -> Tuple[List[Dict], Optional[Cursor]]:
+        """
+        Retorna uma página de músicas e o cursor da próxima
         
-        columns = ['isrc', 'title', 'artist', 'album', 'distributor', 
-                  'duration', 'genre', 'release_date', 'territory', 'status']
+        Returns:
+            Tupla (músicas, cursor da próxima página ou None se acabou)
+        """
+        return self._keyset_page('tracks', TRACK_COLUMNS, columns, 'created_at', limit, after)
+    
+    def search_tracks(self, query: str, distributors: Optional[List[str]] = None,
+                      limit: int = 50, offset: int = 0) -> List[Dict]:
+        """
+        Busca músicas por título, artista ou álbum
         
-        tracks = []
-        for row in cursor.fetchall():
-            tracks.append(dict(zip(columns, row)))
+        Cada palavra da busca casa por prefixo ("beat" encontra "Beatles") e
+        todas precisam aparecer; acentos e caixa são ignorados. Os resultados
+        vêm ordenados por relevância (bm25, título pesando mais que artista e
+        álbum). Sem FTS5 no SQLite, cai em LIKE sobre as três colunas.
         
-        conn.close()
-        return tracks
+        Args:
+            query: Texto digitado pelo usuário
+            distributors: Restringe às distribuidoras informadas
+            limit: Máximo de resultados
+            offset: Resultados a pular (paginação)
+            
+        Returns:
+            Lista de músicas com a coluna extra rank (menor = mais relevante)
+        """
+        terms = query.split()
+        if not terms:
+            return []
+        
+        params: Dict[str, Any] = {'limit': limit, 'offset': offset}
+        distributor_filter = ''
+        if distributors:
+            placeholders = ', '.join(f':dist{i}' for i in range(len(distributors)))
+            distributor_filter = f"AND t.distributor IN ({placeholders})"
+            params.update({f'dist{i}': d for i, d in enumerate(distributors)})
+        select_list = ', '.join(f't.{column}' for column in TRACK_COLUMNS)
+        
+        if self.has_fts:
+            # Cada termo entre aspas (sem operadores do FTS5) e com * para prefixo
+            params['match'] = ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+            weights = ', '.join(str(w) for w in TRACKS_FTS_WEIGHTS)
+            sql = f'''
+                SELECT {select_list}, bm25(tracks_fts, {weights}) AS rank
+                FROM tracks_fts
+                JOIN tracks t ON t.id = tracks_fts.rowid
+                WHERE tracks_fts MATCH :match {distributor_filter}
+                ORDER BY rank
+                LIMIT :limit OFFSET :offset
+            '''
+        else:
+            conditions = []
+            for i, term in enumerate(terms):
+                params[f'term{i}'] = f'%{term}%'
+                conditions.append(
+                    f"(t.title LIKE :term{i} OR t.artist LIKE :term{i} OR t.album LIKE :term{i})"
+                )
+            sql = f'''
+                SELECT {select_list}, 0 AS rank
+                FROM tracks t
+                WHERE {' AND '.join(conditions)} {distributor_filter}
+                ORDER BY t.title
+                LIMIT :limit OFFSET :offset
+            '''
+        
+        cursor = self._connection().execute(sql, params)
+        columns = list(TRACK_COLUMNS) + ['rank']
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
     
     def log_sync(self, distributor: str, sync_type: str, source: str,
                  status: str, records_processed: int = 0,
                  records_success: int = 0, records_failed: int = 0,
                  error_message: str = None) -> None:
         """Registra uma sincronização no histórico"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO sync_history 
-            (distributor, sync_type, source, status, records_processed,
-             records_success, records_failed, error_message, completed_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            distributor, sync_type, source, status,
-            records_processed, records_success, records_failed,
-            error_message, datetime.now()
-        ))
-        
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            conn.execute('''
+                INSERT INTO sync_history 
+                (distributor, sync_type, source, status, records_processed,
+                 records_success, records_failed, error_message, completed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                distributor, sync_type, source, status,
+                records_processed, records_success, records_failed,
+                error_message, datetime.now()
+            ))
     
     def log_csv_upload(self, filename: str, distributor: str,
                       rows_count: int, uploaded_by: str,
                       file_type: str = 'csv', file_size: int = 0) -> int:
         """Registra um upload de CSV"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO csv_uploads 
-            (filename, distributor, file_type, file_size,
-             rows_count, uploaded_by, status, processed_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            filename, distributor, file_type, file_size,
-            rows_count, uploaded_by, 'completed', datetime.now()
-        ))
-        
-        upload_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO csv_uploads 
+                (filename, distributor, file_type, file_size,
+                 rows_count, uploaded_by, status, processed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                filename, distributor, file_type, file_size,
+                rows_count, uploaded_by, 'completed', datetime.now()
+            ))
+            upload_id = cursor.lastrowid
         
         return upload_id
     
     def update_csv_status(self, upload_id: int, status: str) -> None:
         """Atualiza o status de um upload CSV"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE csv_uploads 
-            SET status = ?, processed_at = ?
-            WHERE id = ?
-        ''', (status, datetime.now(), upload_id))
-        
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            conn.execute('''
+                UPDATE csv_uploads 
+                SET status = ?, processed_at = ?
+                WHERE id = ?
+            ''', (status, datetime.now(), upload_id))
     
     def log_api_call(self, distributor: str, endpoint: str,
                     method: str, status_code: int,
                     response_time_ms: int, error_message: str = None) -> None:
-        """Registra uma chamada à API"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """
+        Registra uma chamada à API
         
-        cursor.execute('''
-            INSERT INTO api_logs 
-            (distributor, endpoint, method, status_code,
-             response_time_ms, error_message)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
+        Com async_api_logs a linha só é enfileirada no ApiLogWriter; created_at
+        é o instante da chamada, não o da gravação do lote.
+        """
+        row = (
             distributor, endpoint, method, status_code,
-            response_time_ms, error_message
-        ))
+            response_time_ms, error_message,
+            datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        )
+        if self.async_api_logs:
+            self.api_log_writer.log(row)
+            return
         
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            conn.execute(INSERT_API_LOG_SQL, row)
+    
+    @property
+    def api_log_writer(self) -> ApiLogWriter:
+        """Escritor de logs da API, iniciado na primeira chamada"""
+        if self._api_log_writer is None:
+            with self._connections_lock:
+                if self._api_log_writer is None:
+                    self._api_log_writer = ApiLogWriter(self)
+        return self._api_log_writer
+    
+    def flush_api_logs(self) -> None:
+        """Aguarda a gravação dos logs da API pendentes"""
+        if self._api_log_writer is not None:
+            self._api_log_writer.flush()
     
-    def get_recent_uploads(self, limit: int = 10) -> List[Dict]:
-        """Retorna os uploads mais recentes"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def apply_retention(self, api_log_days: Optional[int] = None, grain: Optional[str] = None,
+                        sync_days: Optional[int] = None,
+                        batch_size: int = RETENTION_BATCH_SIZE) -> Dict[str, Any]:
+        """
+        Consolida e expurga as linhas antigas de api_logs e sync_history
         
-        cursor.execute("""
-            SELECT filename, distributor, rows_count, status, 
-                   uploaded_by, created_at
-            FROM csv_uploads
-            ORDER BY created_at DESC
-            LIMIT ?
-        """, (limit,))
+        As linhas brutas mais antigas que o limite viram agregados
+        (api_log_rollups, sync_history_daily) e são apagadas em lotes de
+        batch_size, cada lote em uma transação curta. Os agregados de api_logs
+        são calculados sobre o balde inteiro, nunca sobre um lote.
         
-        columns = ['filename', 'distributor', 'rows_count', 
-                  'status', 'uploaded_by', 'created_at']
+        Args:
+            api_log_days: Dias de api_logs mantidos brutos (padrão API_LOG_RETENTION_DAYS)
+            grain: Granularidade dos agregados de api_logs: 'minute' ou 'hour'
+            sync_days: Dias de sync_history mantidos brutos (padrão SYNC_HISTORY_RETENTION_DAYS)
+            batch_size: Linhas apagadas por transação
         
-        uploads = []
-        for row in cursor.fetchall():
-            uploads.append(dict(zip(columns, row)))
+        Returns:
+            Dicionário com o resultado da retenção
+        """
+        api_log_days = API_LOG_RETENTION_DAYS if api_log_days is None else api_log_days
+        sync_days = SYNC_HISTORY_RETENTION_DAYS if sync_days is None else sync_days
+        grain = grain or API_LOG_ROLLUP_GRAIN
+        if grain not in API_LOG_ROLLUP_GRAINS:
+            return {
+                'status': 'error',
+                'message': f"Granularidade inválida: {grain} (use {', '.join(API_LOG_ROLLUP_GRAINS)})"
+            }
         
-        conn.close()
-        return uploads
-    
-    def get_sync_history(self, limit: int = 20) -> List[Dict]:
-        """Retorna o histórico de sincronizações"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT distributor, sync_type, source, status,
-                   records_processed, records_success, records_failed,
-                   created_at, completed_at
-            FROM sync_history
-            ORDER BY created_at DESC
-            LIMIT ?
-        """, (limit,))
-        
-        columns = ['distributor', 'sync_type', 'source', 'status',
-                  'records_processed', 'records_success', 'records_failed',
-                  'created_at', 'completed_at']
-        
-        history = []
-        for row in cursor.fetchall():
-            history.append(dict(zip(columns, row)))
+        # Limites alinhados ao início do balde/dia, para não consolidar baldes incompletos
+        now = datetime.utcnow()
+        api_log_cutoff = (now - timedelta(days=api_log_days)).strftime(API_LOG_ROLLUP_GRAINS[grain])
+        sync_cutoff = (now - timedelta(days=sync_days)).strftime('%Y-%m-%d')
         
-        conn.close()
-        return history
\ No newline at end of file
+        try:
+            self.flush_api_logs()
+            api_logs_purged = self._rollup_api_logs(api_log_cutoff, grain, batch_size)
+            sync_purged = self._rollup_sync_history(sync_cutoff, batch_size)
+        except sqlite3.Error as e:
+            print(f"Erro na retenção de logs: {e}")
+            return {
+                'status': 'error',
+                'message': str(e)
+            }
+        
+        return {
+            'status': 'success',
+            'api_logs_purged': api_logs_purged,
+            'api_logs_cutoff': api_log_cutoff,
+            'sync_history_purged': sync_purged,
+            'sync_history_cutoff': sync_cutoff
+        }
+    
+    def _rollup_api_logs(self, cutoff: str, grain: str, batch_size: int) -> int:
+        """
+        Consolida em api_log_rollups e apaga as linhas de api_logs anteriores a cutoff
+        
+        Cada transação trata o balde mais antigo: se ele ainda não tem agregado,
+        o agregado é gravado a partir do balde inteiro (os percentis saem da
+        lista completa de latências, não de um lote); em seguida são apagadas
+        até batch_size linhas brutas do balde. As transações seguintes encontram
+        o agregado pronto e só apagam, de modo que uma retenção interrompida
+        retoma sem contar linhas duas vezes.
+        """
+        purged = 0
+        while True:
+            with self.transaction() as conn:
+                # Trava de escrita antes da leitura: duas retenções simultâneas não
+                # podem consolidar o mesmo balde
+                if not conn.in_transaction:
+                    conn.execute("BEGIN IMMEDIATE")
+                bucket_start = conn.execute(
+                    "SELECT strftime(?, MIN(created_at)) FROM api_logs WHERE created_at < ?",
+                    (API_LOG_ROLLUP_GRAINS[grain], cutoff)
+                ).fetchone()[0]
+                if bucket_start is None:
+                    break
+                
+                bucket_end = datetime.strptime(bucket_start, '%Y-%m-%d %H:%M:%S') + API_LOG_ROLLUP_STEPS[grain]
+                bounds = {'grain': grain, 'start': bucket_start,
+                          'end': bucket_end.strftime('%Y-%m-%d %H:%M:%S')}
+                groups = conn.execute(SELECT_API_LOG_BUCKET_SQL, bounds).fetchall()
+                if groups:
+                    latencies: Dict[Tuple[str, str], List[int]] = {}
+                    for distributor, endpoint, latency in conn.execute('''
+                        SELECT distributor, endpoint, response_time_ms
+                        FROM api_logs
+                        WHERE created_at >= :start AND created_at < :end
+                          AND response_time_ms IS NOT NULL
+                        ORDER BY distributor, endpoint, response_time_ms
+                    ''', bounds):
+                        latencies.setdefault((distributor, endpoint), []).append(latency)
+                    
+                    conn.executemany(INSERT_API_LOG_ROLLUP_SQL, [
+                        (grain, bucket_start, *group,
+                         *self._latency_percentiles(latencies.get((group[0], group[1]), [])))
+                        for group in groups
+                    ])
+                
+                purged += conn.execute('''
+                    DELETE FROM api_logs WHERE id IN (
+                        SELECT id FROM api_logs
+                        WHERE created_at >= :start AND created_at < :end
+                        LIMIT :limit
+                    )
+                ''', {**bounds, 'limit': batch_size}).rowcount
+        return purged
+    
+    @staticmethod
+    def _latency_percentiles(latencies: List[int]) -> Tuple:
+        """Retorna (p50, p95, p99) de uma lista de latências já ordenada"""
+        if not latencies:
+            return (None, None, None)
+        n = len(latencies)
+        # Percentil pelo posto mais próximo
+        return tuple(latencies[max(0, -(-n * q // 100) - 1)] for q in (50, 95, 99))
+    
+    def _rollup_sync_history(self, cutoff: str, batch_size: int) -> int:
+        """Consolida em sync_history_daily e apaga as linhas de sync_history anteriores a cutoff"""
+        batch = '''
+            SELECT id FROM sync_history
+            WHERE started_at < :cutoff
+            ORDER BY started_at, id
+            LIMIT :limit
+        '''
+        params = {'cutoff': cutoff, 'limit': batch_size}
+        purged = 0
+        while True:
+            with self.transaction() as conn:
+                conn.execute(f'''
+                    INSERT INTO sync_history_daily
+                    (day, distributor, runs, failed_runs,
+                     records_processed, records_success, records_failed)
+                    SELECT date(started_at), distributor, COUNT(*),
+                           SUM(status IN ('error', 'failed')),
+                           SUM(COALESCE(records_processed, 0)),
+                           SUM(COALESCE(records_success, 0)),
+                           SUM(COALESCE(records_failed, 0))
+                    FROM sync_history
+                    WHERE id IN ({batch})
+                    GROUP BY date(started_at), distributor
+                    ON CONFLICT(day, distributor) DO UPDATE SET
+                        runs = runs + excluded.runs,
+                        failed_runs = failed_runs + excluded.failed_runs,
+                        records_processed = records_processed + excluded.records_processed,
+                        records_success = records_success + excluded.records_success,
+                        records_failed = records_failed + excluded.records_failed
+                ''', params)
+                deleted = conn.execute(f"DELETE FROM sync_history WHERE id IN ({batch})", params).rowcount
+            if not deleted:
+                return purged
+            purged += deleted
+    
+    def get_api_log_stats(self, hours: int = 24) -> List[Dict]:
+        """
+        Retorna chamadas, erros e latência média por distribuidora nas últimas horas
+        
+        Soma as linhas brutas de api_logs e os agregados de api_log_rollups, de
+        modo que o resultado não muda quando a retenção consolida o período.
+        """
+        self.flush_api_logs()
+        since = (datetime.utcnow() - timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M:%S')
+        cursor = self._connection().execute('''
+            SELECT distributor, SUM(calls), SUM(errors), SUM(latency_sum), SUM(latency_count)
+            FROM (
+                SELECT distributor, 1 AS calls,
+                       (error_message IS NOT NULL OR COALESCE(status_code, 0) >= 400) AS errors,
+                       COALESCE(response_time_ms, 0) AS latency_sum,
+                       (response_time_ms IS NOT NULL) AS latency_count
+                FROM api_logs
+                WHERE created_at >= :since
+                UNION ALL
+                SELECT distributor, calls, errors, latency_sum, latency_count
+                FROM api_log_rollups
+                WHERE bucket_start >= :since
+            )
+            GROUP BY distributor
+            ORDER BY distributor
+        ''', {'since': since})
+        return [
+            {
+                'distributor': distributor,
+                'calls': calls,
+                'errors': errors,
+                'error_rate': errors / calls * 100 if calls else 0.0,
+                'avg_response_time_ms': latency_sum / latency_count if latency_count else None
+            }
+            for distributor, calls, errors, latency_sum, latency_count in cursor.fetchall()
+        ]
+    
+    def get_recent_uploads(self, limit: int = 10, after: Optional[Cursor] = None) -> List[Dict]:
+        """
+        Retorna os uploads mais recentes
+        
+        Args:
+            limit: Quantidade de uploads
+            after: Cursor (created_at, id) devolvido por get_uploads_page
+        """
+        rows, _ = self.get_uploads_page(limit, after)
+        return rows
+    
+    def get_uploads_page(self, limit: int = 10, after: Optional[Cursor] = None,
+                         columns: Optional[List[str]] = None) -> Tuple[List[Dict], Optional[Cursor]]:
+        """
+        Retorna uma página de uploads e o cursor da próxima
+        
+        Returns:
+            Tupla (uploads, cursor da próxima página ou None se acabou)
+        """
+        return self._keyset_page('csv_uploads', UPLOAD_COLUMNS, columns, 'created_at', limit, after)
+    
+    def iter_uploads(self, columns: Optional[List[str]] = None, batch_size: int = 1000,
+                     after: Optional[Cursor] = None) -> Iterator[Dict]:
+        """Percorre os uploads do mais recente para o mais antigo em lotes"""
+        for row, _ in self._iter_keyset('csv_uploads', UPLOAD_COLUMNS, columns, 'created_at', batch_size, after):
+            yield row
+    
+    def get_sync_history(self, limit: int = 20, after: Optional[Cursor] = None) -> List[Dict]:
+        """
+        Retorna o histórico de sincronizações
+        
+        Args:
+            limit: Quantidade de sincronizações
+            after: Cursor (started_at, id) devolvido por get_sync_history_page
+        """
+        rows, _ = self.get_sync_history_page(limit, after)
+        return rows
+    
+    def get_sync_history_page(self, limit: int = 20, after: Optional[Cursor] = None,
+                              columns: Optional[List[str]] = None) -> Tuple[List[Dict], Optional[Cursor]]:
+        """
+        Retorna uma página do histórico de sincronizações e o cursor da próxima
+        
+        Returns:
+            Tupla (sincronizações, cursor da próxima página ou None se acabou)
+        """
+        return self._keyset_page('sync_history', SYNC_COLUMNS, columns, 'started_at', limit, after)
+    
+    def iter_sync_history(self, columns: Optional[List[str]] = None, batch_size: int = 1000,
+                          after: Optional[Cursor] = None) -> Iterator[Dict]:
+        """Percorre o histórico de sincronizações do mais recente para o mais antigo em lotes"""
+        for row, _ in self._iter_keyset('sync_history', SYNC_COLUMNS, columns, 'started_at', batch_size, after):
+            yield row
+    
+    def _keyset_page(self, table: str, allowed: Tuple[str, ...], columns: Optional[List[str]],
+                     order_column: str, limit: int, after: Optional[Cursor]) -> Tuple[List[Dict], Optional[Cursor]]:
+        """Lê uma única página com paginação por chave e devolve o cursor da próxima"""
+        rows = []
+        cursor = None
+        for row, cursor in self._iter_keyset(table, allowed, columns, order_column, limit, after, pages=1):
+            rows.append(row)
+        return rows, cursor if len(rows) == limit else None
+    
+    def _iter_keyset(self, table: str, allowed: Tuple[str, ...], columns: Optional[List[str]],
+                     order_column: str, batch_size: int, after: Optional[Cursor],
+                     pages: Optional[int] = None) -> Iterator[Tuple[Dict, Cursor]]:
+        """
+        Percorre uma tabela em ordem decrescente de (order_column, id) por paginação por chave
+        
+        Cada lote continua logo após o cursor: as linhas com o mesmo valor de
+        order_column e id menor, unidas às de valor menor. As duas partes são
+        buscas no índice de order_column (que já inclui o rowid), então o custo
+        por página é constante mesmo com muitas linhas no mesmo instante; a forma
+        (order_column, id) < (?, ?) só usaria a primeira coluna do índice.
+        
+        Args:
+            table: Nome da tabela
+            allowed: Colunas que podem ser projetadas
+            columns: Colunas pedidas (padrão: todas de allowed)
+            order_column: Coluna de ordenação do cursor
+            batch_size: Linhas por consulta
+            after: Cursor (valor de order_column, id) da última linha já lida
+            pages: Para depois desta quantidade de consultas
+            
+        Yields:
+            Tuplas (linha como dicionário, cursor dessa linha)
+        """
+        columns = list(columns or allowed)
+        invalid = [column for column in columns if column not in allowed]
+        if invalid:
+            raise ValueError(f"Colunas inválidas para {table}: {invalid}")
+        
+        select_list = ', '.join(columns + [order_column, 'id'])
+        order = f"ORDER BY {order_column} DESC, id DESC LIMIT :limit"
+        first_page = f"SELECT {select_list} FROM {table} {order}"
+        next_page = f"""
+            SELECT * FROM (
+                SELECT {select_list} FROM {table}
+                WHERE {order_column} = :value AND id < :id
+                ORDER BY id DESC LIMIT :limit
+            )
+            UNION ALL
+            SELECT * FROM (
+                SELECT {select_list} FROM {table}
+                WHERE {order_column} < :value
+                {order}
+            )
+            {order}
+        """
+        
+        conn = self._connection()
+        cursor = tuple(after) if after is not None else None
+        page = 0
+        while pages is None or page < pages:
+            if cursor is None:
+                rows = conn.execute(first_page, {'limit': batch_size}).fetchall()
+            else:
+                rows = conn.execute(next_page, {'value': cursor[0], 'id': cursor[1], 'limit': batch_size}).fetchall()
+            page += 1
+            
+            for row in rows:
+                cursor = (row[-2], row[-1])
+                yield dict(zip(columns, row[:-2])), cursor
+            if len(rows) < batch_size:
+                return
+
+
+def main():
+    """Ponto de entrada da linha de comando"""
+    parser = argparse.ArgumentParser(description="Manutenção do banco de dados de músicas e logs")
+    parser.add_argument("--db", default="data/database.db", help="Caminho do arquivo SQLite")
+    parser.add_argument("--retention", action="store_true",
+                        help="Consolida e expurga api_logs e sync_history antigos")
+    parser.add_argument("--api-log-days", type=int, default=None, help="Dias de api_logs mantidos brutos")
+    parser.add_argument("--sync-days", type=int, default=None, help="Dias de sync_history mantidos brutos")
+    parser.add_argument("--grain", choices=sorted(API_LOG_ROLLUP_GRAINS), default=None,
+                        help="Granularidade dos agregados de api_logs")
+    args = parser.parse_args()
+    
+    if not args.retention:
+        parser.print_help()
+        return
+    
+    db = Database(args.db)
+    try:
+        result = db.apply_retention(args.api_log_days, args.grain, args.sync_days)
+    finally:
+        db.close()
+    
+    if result['status'] != 'success':
+        print(f"❌ {result['message']}")
+        return
+    print("\n✅ Retenção aplicada")
+    print(f"   - api_logs consolidados: {result['api_logs_purged']} (anteriores a {result['api_logs_cutoff']})")
+    print(f"   - sync_history consolidados: {result['sync_history_purged']} (anteriores a {result['sync_history_cutoff']})")
+
+
+if __name__ == "__main__":
+    main()
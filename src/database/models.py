@@ -1,17 +1,184 @@
 """
 Modelos do banco de dados para o sistema
 """
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Date, Boolean, ForeignKey, Text
+from sqlalchemy import create_engine, event, Column, Integer, BigInteger, String, Float, DateTime, Date, Boolean, ForeignKey, Text, Index, text, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
-from datetime import datetime
+from datetime import datetime, date, timedelta
+from typing import Iterable, Optional
 import os
+import re
+import threading
+
+from src.database.sqlite_config import SQLITE_PRAGMAS
 
 Base = declarative_base()
 
-# Configuração do banco de dados
-DATABASE_URL = "sqlite:///data/music_distribution.db"
-engine = create_engine(DATABASE_URL, echo=False)
+# Configuração do banco de dados (sobrescrita por DATABASE_URL ou configure_database)
+DATABASE_URL = os.getenv('DATABASE_URL', "sqlite:///data/music_distribution.db")
+
+# Engine, fábrica de sessões e bootstrap são criados sob demanda, uma vez por
+# processo: importar este módulo não abre o banco
+_engine = None
+_Session = None
+_bootstrapped = False
+_bootstrap_lock = threading.RLock()
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Configura cada conexão SQLite aberta pelo pool do engine"""
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma} = {value}")
+    cursor.close()
+
+
+def configure_database(url: str) -> None:
+    """
+    Aponta o módulo para outro banco antes (ou no lugar) do padrão
+    
+    Descarta o engine atual; o próximo acesso cria o engine da nova URL e
+    repete o bootstrap nela.
+    
+    Args:
+        url: URL do SQLAlchemy, ex.: sqlite:///data/outro.db
+    """
+    global DATABASE_URL, _engine, _Session, _bootstrapped
+    with _bootstrap_lock:
+        if _engine is not None:
+            _engine.dispose()
+        DATABASE_URL = url
+        _engine = None
+        _Session = None
+        _bootstrapped = False
+
+
+def get_engine():
+    """Retorna o engine do processo, criando-o na primeira chamada (sem bootstrap)"""
+    global _engine
+    if _engine is None:
+        with _bootstrap_lock:
+            if _engine is None:
+                engine = create_engine(DATABASE_URL, echo=False)
+                if engine.dialect.name == 'sqlite':
+                    event.listen(engine, "connect", _apply_sqlite_pragmas)
+                _engine = engine
+    return _engine
+
+
+def bootstrap_database():
+    """
+    Cria tabelas, aplica migrações e cadastra os dados padrão
+    
+    Roda uma única vez por processo (e por URL); as chamadas seguintes só
+    devolvem o engine.
+    
+    Returns:
+        Engine já inicializado
+    """
+    global _bootstrapped
+    if _bootstrapped:
+        return _engine
+    with _bootstrap_lock:
+        if not _bootstrapped:
+            engine = get_engine()
+            Base.metadata.create_all(engine)
+            _seed_dsp_aliases()
+            migrated = _migrate_legacy_dsp_columns()
+            _add_missing_columns()
+            _ensure_indexes()
+            _seed_dsp_rates()
+            if 'analytics' in migrated:
+                _reprice_migrated_analytics()
+            _backfill_rollups()
+            _seed_data_generation()
+            _bootstrapped = True
+    return _engine
+
+
+def __getattr__(name):
+    """Mantém models.engine e models.Session para quem ainda os importa"""
+    if name == 'engine':
+        return bootstrap_database()
+    if name == 'Session':
+        return _session_factory()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Valores médios por stream (em USD), usados como tarifas iniciais
+# Fonte: Estimativas da indústria
+DEFAULT_DSP_RATES = {
+    'Spotify': 0.003,
+    'Apple Music': 0.007,
+    'YouTube Music': 0.002,
+    'YouTube': 0.001,
+    'Amazon Music': 0.004,
+    'Deezer': 0.006,
+    'Tidal': 0.012,
+    'SoundCloud': 0.003,
+    'Pandora': 0.002,
+    'Facebook': 0.004,
+    'Instagram': 0.003,
+    'TikTok': 0.003,
+    'Snapchat': 0.002
+}
+DEFAULT_RATE = 0.003  # DSPs sem tarifa cadastrada
+RATES_START_DATE = date(2000, 1, 1)
+
+# Apelidos conhecidos -> nome canônico do DSP (comparação sem diferenciar maiúsculas)
+DEFAULT_DSP_ALIASES = {
+    'Apple': 'Apple Music',
+    'iTunes': 'Apple Music',
+    'Amazon': 'Amazon Music',
+    'Amazon Unlimited': 'Amazon Music',
+    'Amazon Prime': 'Amazon Music',
+    'YouTube Content ID': 'YouTube',
+    'YouTube Shorts': 'YouTube',
+    'Youtube Music': 'YouTube Music',
+    'Tiktok': 'TikTok',
+}
+# Sufixos de variante do export, ex.: "Deezer_30", "Apple Music_30"
+DSP_VARIANT_SUFFIX_RE = re.compile(r'_\d+$')
+
+
+def normalize_dsp_name(raw: str) -> str:
+    """
+    Aplica as regras de normalização de nome de DSP (sem consultar o banco)
+    
+    Remove espaços sobrando e o sufixo numérico de variante ("Deezer_30" -> "Deezer").
+    
+    Args:
+        raw: Nome do DSP como veio no CSV
+        
+    Returns:
+        Nome normalizado
+    """
+    name = ' '.join(str(raw).split())
+    return DSP_VARIANT_SUFFIX_RE.sub('', name).strip() or name
+
+
+class DSP(Base):
+    """Dimensão de DSPs (Digital Service Providers) com nome canônico"""
+    __tablename__ = 'dsps'
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False, unique=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relacionamentos
+    aliases = relationship("DSPAlias", back_populates="dsp")
+
+
+class DSPAlias(Base):
+    """Nome alternativo de um DSP, resolvido para o DSP canônico na importação"""
+    __tablename__ = 'dsp_aliases'
+    
+    id = Column(Integer, primary_key=True)
+    alias = Column(String(100), nullable=False, unique=True)  # armazenado em casefold
+    dsp_id = Column(Integer, ForeignKey('dsps.id'), nullable=False)
+    
+    # Relacionamentos
+    dsp = relationship("DSP", back_populates="aliases")
 
 
 class Artist(Base):
@@ -79,7 +246,7 @@ class Analytics(Base):
     id = Column(Integer, primary_key=True)
     artist_id = Column(Integer, ForeignKey('artists.id'))
     track_id = Column(Integer, ForeignKey('tracks.id'), nullable=True)
-    dsp = Column(String(100), nullable=False)  # Digital Service Provider
+    dsp_id = Column(Integer, ForeignKey('dsps.id'), nullable=False)  # Digital Service Provider
     date = Column(Date, nullable=False)
     streams = Column(Integer, default=0)
     revenue = Column(Float, default=0.0)
@@ -89,6 +256,13 @@ class Analytics(Base):
     # Relacionamentos
     artist = relationship("Artist", back_populates="analytics")
     track = relationship("Track", back_populates="analytics")
+    dsp = relationship("DSP")
+    
+    __table_args__ = (
+        Index('uq_analytics_artist_dsp_date', 'artist_id', 'dsp_id', 'date', unique=True),
+        Index('ix_analytics_artist_date', 'artist_id', 'date'),
+        Index('ix_analytics_dsp_date', 'dsp_id', 'date'),
+    )
 
 
 class CSVImport(Base):
@@ -106,22 +280,566 @@ class CSVImport(Base):
     error_message = Column(Text)
     imported_at = Column(DateTime, default=datetime.utcnow)
     imported_by = Column(String(100))
+    rows_committed = Column(Integer, default=0)  # linhas do CSV já gravadas (modo streaming)
+    artist_id = Column(Integer, ForeignKey('artists.id'))
+    content_hash = Column(String(64), index=True)  # SHA-256 do arquivo
+    file_size = Column(Integer)
+    data_year = Column(Integer)  # ano informado para as colunas de data (None = inferido)
+
+
+class AnalyticsFingerprint(Base):
+    """Impressão digital de cada célula DSP/data já importada, para pular valores inalterados"""
+    __tablename__ = 'analytics_fingerprints'
+    
+    id = Column(Integer, primary_key=True)
+    artist_id = Column(Integer, ForeignKey('artists.id'), nullable=False)
+    dsp_id = Column(Integer, ForeignKey('dsps.id'), nullable=False)
+    date = Column(Date, nullable=False)
+    fingerprint = Column(BigInteger, nullable=False)
+    import_id = Column(Integer, ForeignKey('csv_imports.id'))
+    
+    __table_args__ = (
+        Index('uq_fingerprints_artist_dsp_date', 'artist_id', 'dsp_id', 'date', unique=True),
+        Index('ix_fingerprints_artist_date', 'artist_id', 'date'),
+    )
+
+
+class DataGeneration(Base):
+    """Contador de geração dos dados, incrementado a cada alteração de analytics"""
+    __tablename__ = 'data_generation'
+    
+    id = Column(Integer, primary_key=True)  # linha única (id = 1)
+    generation = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class AnalyticsRollup(Base):
+    """Totais de analytics pré-agregados por artista, DSP e período (dia, semana ISO ou mês)"""
+    __tablename__ = 'analytics_rollups'
+    
+    id = Column(Integer, primary_key=True)
+    grain = Column(String(10), nullable=False)  # day, week, month
+    artist_id = Column(Integer, ForeignKey('artists.id'), nullable=False)
+    dsp_id = Column(Integer, ForeignKey('dsps.id'), nullable=False)
+    period_start = Column(Date, nullable=False)  # dia, segunda-feira da semana ou dia 1 do mês
+    streams = Column(BigInteger, default=0)
+    revenue = Column(Float, default=0.0)
+    days = Column(Integer, default=0)  # dias com dados no período
+    first_date = Column(Date)
+    last_date = Column(Date)
+    
+    # Relacionamentos
+    dsp = relationship("DSP")
+    
+    __table_args__ = (
+        Index('uq_rollups_artist_grain_period_dsp', 'artist_id', 'grain', 'period_start', 'dsp_id', unique=True),
+    )
+
+
+class DSPRate(Base):
+    """Tarifa por stream de um DSP, válida no intervalo [effective_from, effective_to)"""
+    __tablename__ = 'dsp_rates'
+    
+    id = Column(Integer, primary_key=True)
+    dsp_id = Column(Integer, ForeignKey('dsps.id'), nullable=False)
+    rate = Column(Float, nullable=False)
+    effective_from = Column(Date, nullable=False)
+    effective_to = Column(Date)  # None = vigente
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relacionamentos
+    dsp = relationship("DSP")
+    
+    __table_args__ = (
+        Index('ix_dsp_rates_dsp_from', 'dsp_id', 'effective_from'),
+    )
+
+
+def resolve_dsp_ids(bind, names: Iterable[str]) -> dict:
+    """
+    Resolve nomes de DSP do CSV para o id do DSP canônico, cadastrando os novos
+    
+    A busca usa, nesta ordem, o apelido exato, o apelido do nome normalizado e o
+    nome canônico, sempre sem diferenciar maiúsculas.
+    
+    Args:
+        bind: Sessão ou conexão ativa do banco de dados
+        names: Nomes de DSP como vieram no CSV
+        
+    Returns:
+        Dicionário nome original -> id do DSP
+    """
+    names = set(names)
+    if not names:
+        return {}
+    
+    aliases = {alias: dsp_id for alias, dsp_id in bind.execute(select(DSPAlias.alias, DSPAlias.dsp_id))}
+    canonical = {name.casefold(): dsp_id for dsp_id, name in bind.execute(select(DSP.id, DSP.name))}
+    
+    def lookup(raw):
+        normalized = normalize_dsp_name(raw)
+        for key in (' '.join(str(raw).split()).casefold(), normalized.casefold()):
+            if key in aliases:
+                return aliases[key]
+        return canonical.get(normalized.casefold())
+    
+    resolved = {raw: lookup(raw) for raw in names}
+    missing = {}
+    for raw, dsp_id in resolved.items():
+        if dsp_id is None:
+            normalized = normalize_dsp_name(raw)
+            missing.setdefault(normalized.casefold(), normalized)
+    
+    if missing:
+        bind.execute(
+            sqlite_insert(DSP).on_conflict_do_nothing(index_elements=['name']),
+            [{'name': name, 'created_at': datetime.utcnow()} for name in missing.values()]
+        )
+        canonical = {name.casefold(): dsp_id for dsp_id, name in bind.execute(select(DSP.id, DSP.name))}
+        resolved = {raw: dsp_id if dsp_id is not None else canonical[normalize_dsp_name(raw).casefold()]
+                    for raw, dsp_id in resolved.items()}
+    return resolved
 
 
-# Criar tabelas
-Base.metadata.create_all(engine)
+def resolve_dsp_id(bind, name: str) -> int:
+    """Resolve um único nome de DSP para o id canônico (ver resolve_dsp_ids)"""
+    return resolve_dsp_ids(bind, [name])[name]
 
-# Criar sessão
-Session = sessionmaker(bind=engine)
+
+# Tabelas que guardavam o nome do DSP como texto antes da dimensão dsps
+_LEGACY_DSP_COPY_SQL = {
+    # Variantes do mesmo DSP na mesma data são somadas; duplicatas exatas mantêm a mais recente
+    'analytics': """
+        INSERT INTO analytics (artist_id, track_id, dsp_id, date, streams, revenue, territory, created_at)
+        SELECT l.artist_id, MAX(l.track_id), m.dsp_id, l.date,
+               SUM(l.streams), SUM(l.revenue), MAX(l.territory), MIN(l.created_at)
+        FROM analytics_legacy l
+        JOIN dsp_map m ON m.raw = l.dsp
+        WHERE l.id IN (SELECT MAX(id) FROM analytics_legacy GROUP BY artist_id, dsp, date)
+        GROUP BY l.artist_id, m.dsp_id, l.date
+    """,
+    # Só as tarifas cadastradas com o nome canônico são mantidas
+    'dsp_rates': """
+        INSERT INTO dsp_rates (dsp_id, rate, effective_from, effective_to, created_at)
+        SELECT m.dsp_id, l.rate, l.effective_from, l.effective_to, l.created_at
+        FROM dsp_rates_legacy l
+        JOIN dsp_map m ON m.raw = l.dsp
+        JOIN dsps d ON d.id = m.dsp_id AND d.name = l.dsp
+    """,
+    # Impressões digitais são só cache: recomeçam vazias
+    'analytics_fingerprints': None,
+}
+
+
+def _migrate_legacy_dsp_columns() -> list:
+    """
+    Converte tabelas com a coluna de texto dsp para a chave estrangeira dsp_id
+    
+    Returns:
+        Nomes das tabelas convertidas
+    """
+    with get_engine().begin() as conn:
+        legacy = []
+        for table_name in _LEGACY_DSP_COPY_SQL:
+            columns = {row[1] for row in conn.execute(text(f"PRAGMA table_info('{table_name}')"))}
+            if 'dsp' in columns and 'dsp_id' not in columns:
+                legacy.append(table_name)
+        if not legacy:
+            return legacy
+        
+        raw_names = set()
+        for table_name in legacy:
+            raw_names.update(row[0] for row in conn.execute(text(f"SELECT DISTINCT dsp FROM {table_name}")))
+        dsp_ids = resolve_dsp_ids(conn, raw_names)
+        
+        conn.execute(text("CREATE TEMP TABLE dsp_map (raw TEXT PRIMARY KEY, dsp_id INTEGER NOT NULL)"))
+        if dsp_ids:
+            conn.execute(text("INSERT INTO dsp_map (raw, dsp_id) VALUES (:raw, :dsp_id)"),
+                         [{'raw': raw, 'dsp_id': dsp_id} for raw, dsp_id in dsp_ids.items()])
+        
+        for table_name in legacy:
+            # Os nomes dos índices são reaproveitados pela nova tabela
+            for row in conn.execute(text(f"PRAGMA index_list('{table_name}')")).fetchall():
+                if row[3] == 'c':
+                    conn.execute(text(f"DROP INDEX {row[1]}"))
+            conn.execute(text(f"ALTER TABLE {table_name} RENAME TO {table_name}_legacy"))
+            Base.metadata.tables[table_name].create(conn)
+            if _LEGACY_DSP_COPY_SQL[table_name]:
+                conn.execute(text(_LEGACY_DSP_COPY_SQL[table_name]))
+            conn.execute(text(f"DROP TABLE {table_name}_legacy"))
+        
+        conn.execute(text("DROP TABLE dsp_map"))
+    return legacy
+
+
+def _reprice_migrated_analytics():
+    """
+    Recalcula receita e rollups dos analytics convertidos por _migrate_legacy_dsp_columns
+    
+    A receita antiga foi calculada com a tarifa do nome bruto (ex.: "YouTube
+    Content ID" com DEFAULT_RATE); depois da conversão vale a tarifa do DSP
+    canônico. Roda depois de _seed_dsp_rates para que as tarifas existam.
+    """
+    with get_engine().begin() as conn:
+        recompute_revenue(conn)
+
+
+def _add_missing_columns():
+    """Adiciona colunas novas dos modelos em tabelas criadas por versões anteriores"""
+    with get_engine().begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info('{table.name}')"))}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=conn.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+
+def _ensure_indexes():
+    """Cria os índices dos modelos em bancos criados antes deles existirem"""
+    with get_engine().begin() as conn:
+        existing = {row[1] for row in conn.execute(text("PRAGMA index_list('analytics')"))}
+        if 'uq_analytics_artist_dsp_date' not in existing:
+            # Remove duplicatas antigas (mantém o mais recente) antes do índice único
+            conn.execute(text("""
+                DELETE FROM analytics
+                WHERE id NOT IN (
+                    SELECT MAX(id) FROM analytics
+                    GROUP BY artist_id, dsp_id, date
+                )
+            """))
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+def _seed_dsp_aliases():
+    """Cadastra os apelidos padrão que ainda não existem"""
+    with get_engine().begin() as conn:
+        dsp_ids = resolve_dsp_ids(conn, set(DEFAULT_DSP_ALIASES.values()))
+        conn.execute(
+            sqlite_insert(DSPAlias).on_conflict_do_nothing(index_elements=['alias']),
+            [{'alias': alias.casefold(), 'dsp_id': dsp_ids[name]} for alias, name in DEFAULT_DSP_ALIASES.items()]
+        )
+
+
+def _seed_dsp_rates():
+    """Cadastra as tarifas padrão quando a tabela de tarifas está vazia"""
+    with get_engine().begin() as conn:
+        if conn.execute(text("SELECT 1 FROM dsp_rates LIMIT 1")).first():
+            return
+        dsp_ids = resolve_dsp_ids(conn, DEFAULT_DSP_RATES)
+        conn.execute(DSPRate.__table__.insert(), [
+            {'dsp_id': dsp_ids[dsp], 'rate': rate, 'effective_from': RATES_START_DATE, 'created_at': datetime.utcnow()}
+            for dsp, rate in DEFAULT_DSP_RATES.items()
+        ])
+
+
+# Expressão SQLite do início do período de cada granularidade ({col} = coluna de data)
+ROLLUP_PERIOD_SQL = {
+    'day': "{col}",
+    'week': "date({col}, '-' || ((CAST(strftime('%w', {col}) AS INTEGER) + 6) % 7) || ' days')",
+    'month': "date({col}, 'start of month')",
+}
+ROLLUP_GRAINS = tuple(ROLLUP_PERIOD_SQL)
+
+
+def period_bounds(grain: str, start_date: date, end_date: date) -> tuple:
+    """
+    Expande um intervalo de datas para os limites dos períodos que ele toca
+    
+    Args:
+        grain: Granularidade (day, week ou month)
+        start_date: Data inicial (inclusive)
+        end_date: Data final (inclusive)
+        
+    Returns:
+        Tupla (início do primeiro período, fim exclusivo do último período)
+    """
+    if grain == 'day':
+        return start_date, end_date + timedelta(days=1)
+    if grain == 'week':
+        return (start_date - timedelta(days=start_date.weekday()),
+                end_date + timedelta(days=7 - end_date.weekday()))
+    if grain == 'month':
+        next_month = (end_date.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return start_date.replace(day=1), next_month
+    raise ValueError(f"Granularidade inválida: {grain}")
+
+
+def refresh_rollups(bind, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                    artist_id: Optional[int] = None, dsp_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recalcula os rollups dos períodos tocados por um intervalo de datas
+    
+    Cada período afetado é apagado e reagregado a partir de analytics com uma
+    consulta por granularidade. Sem datas, o intervalo fica aberto naquele lado.
+    Não faz commit: roda dentro da transação de quem chama.
+    
+    Args:
+        bind: Sessão ou conexão ativa do banco de dados
+        start_date: Primeira data alterada
+        end_date: Última data alterada
+        artist_id: Restringe a um artista
+        dsp_ids: Restringe a estes DSPs
+        
+    Returns:
+        Quantidade de linhas de rollup gravadas
+    """
+    base_filters = []
+    base_params = {}
+    if artist_id is not None:
+        base_filters.append("artist_id = :artist_id")
+        base_params['artist_id'] = artist_id
+    if dsp_ids is not None:
+        dsp_ids = sorted(set(int(dsp_id) for dsp_id in dsp_ids))
+        if not dsp_ids:
+            return 0
+        base_filters.append(f"dsp_id IN ({', '.join(str(dsp_id) for dsp_id in dsp_ids)})")
+    
+    written = 0
+    for grain, period_sql in ROLLUP_PERIOD_SQL.items():
+        filters = list(base_filters)
+        params = dict(base_params, grain=grain)
+        delete_filters = list(filters)
+        if start_date is not None:
+            params['lo'] = period_bounds(grain, start_date, start_date)[0]
+            delete_filters.append("period_start >= :lo")
+            filters.append("date >= :lo")
+        if end_date is not None:
+            params['hi'] = period_bounds(grain, end_date, end_date)[1]
+            delete_filters.append("period_start < :hi")
+            filters.append("date < :hi")
+        
+        delete_where = " AND ".join(["grain = :grain"] + delete_filters)
+        bind.execute(text(f"DELETE FROM analytics_rollups WHERE {delete_where}"), params)
+        
+        where = f"WHERE {' AND '.join(f'a.{f}' for f in filters)}" if filters else ""
+        result = bind.execute(text(f"""
+            INSERT INTO analytics_rollups
+                (grain, artist_id, dsp_id, period_start, streams, revenue, days, first_date, last_date)
+            SELECT :grain, a.artist_id, a.dsp_id, {period_sql.format(col='a.date')} AS period,
+                   SUM(a.streams), SUM(a.revenue), COUNT(*), MIN(a.date), MAX(a.date)
+            FROM analytics a
+            {where}
+            GROUP BY a.artist_id, a.dsp_id, period
+        """), params)
+        written += result.rowcount
+    return written
+
+
+def _seed_data_generation():
+    """Cria a linha única do contador de geração"""
+    with get_engine().begin() as conn:
+        conn.execute(
+            sqlite_insert(DataGeneration).on_conflict_do_nothing(index_elements=['id']),
+            {'id': 1, 'generation': 0, 'updated_at': datetime.utcnow()}
+        )
+
+
+def _backfill_rollups():
+    """Gera os rollups de bancos que já tinham analytics antes deles existirem"""
+    with get_engine().begin() as conn:
+        if conn.execute(text("SELECT 1 FROM analytics_rollups LIMIT 1")).first():
+            return
+        if not conn.execute(text("SELECT 1 FROM analytics LIMIT 1")).first():
+            return
+        refresh_rollups(conn)
+
+
+def _session_factory():
+    """Retorna a fábrica de sessões, fazendo o bootstrap na primeira chamada"""
+    global _Session
+    if _Session is None:
+        engine = bootstrap_database()
+        with _bootstrap_lock:
+            if _Session is None:
+                _Session = sessionmaker(bind=engine)
+    return _Session
 
 
 def get_session():
     """Retorna uma nova sessão do banco de dados"""
-    return Session()
+    return _session_factory()()
+
+
+def get_data_generation(bind) -> int:
+    """Retorna a geração atual dos dados (muda sempre que analytics é alterado)"""
+    return bind.execute(text("SELECT generation FROM data_generation WHERE id = 1")).scalar() or 0
+
+
+def bump_data_generation(bind) -> None:
+    """
+    Incrementa a geração dos dados, invalidando resultados em cache
+    
+    Roda na transação de quem chama: a nova geração só fica visível no commit
+    junto com os dados alterados.
+    
+    Args:
+        bind: Sessão ou conexão ativa do banco de dados
+    """
+    bind.execute(
+        text("UPDATE data_generation SET generation = generation + 1, updated_at = :now WHERE id = 1"),
+        {'now': datetime.utcnow()}
+    )
+
+
+def upsert_analytics(session, records: list) -> int:
+    """
+    Insere ou atualiza registros de analytics com INSERT ... ON CONFLICT
+    
+    Args:
+        session: Sessão ativa do banco de dados
+        records: Lista de dicionários com artist_id, dsp_id, date, streams, revenue e territory
+        
+    Returns:
+        Quantidade de registros enviados
+    """
+    if not records:
+        return 0
+    
+    stmt = sqlite_insert(Analytics)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['artist_id', 'dsp_id', 'date'],
+        set_={
+            'streams': stmt.excluded.streams,
+            'revenue': stmt.excluded.revenue
+        }
+    )
+    session.execute(stmt, records)
+    return len(records)
+
+
+def upsert_fingerprints(session, records: list) -> int:
+    """
+    Insere ou atualiza as impressões digitais das células importadas
+    
+    Args:
+        session: Sessão ativa do banco de dados
+        records: Lista de dicionários com artist_id, dsp_id, date, fingerprint e import_id
+        
+    Returns:
+        Quantidade de registros enviados
+    """
+    if not records:
+        return 0
+    
+    stmt = sqlite_insert(AnalyticsFingerprint)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['artist_id', 'dsp_id', 'date'],
+        set_={
+            'fingerprint': stmt.excluded.fingerprint,
+            'import_id': stmt.excluded.import_id
+        }
+    )
+    session.execute(stmt, records)
+    return len(records)
+
+
+def set_dsp_rate(session, dsp: str, rate: float, effective_from: date) -> DSPRate:
+    """
+    Cadastra uma nova tarifa para o DSP a partir de uma data
+    
+    A tarifa vigente naquela data é encerrada em effective_from. A receita já
+    gravada não é alterada; use recompute_revenue em seguida.
+    
+    Args:
+        session: Sessão ativa do banco de dados
+        dsp: Nome do DSP (apelidos e variantes são resolvidos para o canônico)
+        rate: Valor por stream em USD
+        effective_from: Data de início da nova tarifa
+        
+    Returns:
+        Tarifa criada
+    """
+    dsp_id = resolve_dsp_id(session, dsp)
+    current = session.query(DSPRate).filter(
+        DSPRate.dsp_id == dsp_id,
+        DSPRate.effective_from <= effective_from,
+        (DSPRate.effective_to.is_(None)) | (DSPRate.effective_to > effective_from)
+    ).first()
+    
+    # A nova tarifa vale até o início da próxima já cadastrada, se houver
+    following = session.query(DSPRate).filter(
+        DSPRate.dsp_id == dsp_id,
+        DSPRate.effective_from > effective_from
+    ).order_by(DSPRate.effective_from).first()
+    
+    if current:
+        if current.effective_from == effective_from:
+            session.delete(current)
+        else:
+            current.effective_to = effective_from
+    
+    new_rate = DSPRate(
+        dsp_id=dsp_id,
+        rate=rate,
+        effective_from=effective_from,
+        effective_to=following.effective_from if following else None
+    )
+    session.add(new_rate)
+    return new_rate
+
+
+def recompute_revenue(session, dsp: Optional[str] = None,
+                      start_date: Optional[date] = None, end_date: Optional[date] = None) -> int:
+    """
+    Recalcula a receita dos analytics com as tarifas vigentes em cada data
+    
+    Executa um único UPDATE ... FROM no banco; DSPs sem tarifa usam DEFAULT_RATE.
+    Os rollups do mesmo recorte são recalculados na mesma transação.
+    
+    Args:
+        session: Sessão ativa do banco de dados
+        dsp: Restringe a um DSP
+        start_date: Data inicial (inclusive)
+        end_date: Data final (inclusive)
+        
+    Returns:
+        Quantidade de registros atualizados
+    """
+    filters = []
+    params = {'default_rate': DEFAULT_RATE}
+    dsp_ids = None
+    if dsp is not None:
+        filters.append("a.dsp_id = :dsp_id")
+        params['dsp_id'] = resolve_dsp_id(session, dsp)
+        dsp_ids = [params['dsp_id']]
+    if start_date is not None:
+        filters.append("a.date >= :start_date")
+        params['start_date'] = start_date
+    if end_date is not None:
+        filters.append("a.date <= :end_date")
+        params['end_date'] = end_date
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+    
+    result = session.execute(text(f"""
+        UPDATE analytics
+        SET revenue = ROUND(analytics.streams * r.rate, 2)
+        FROM (
+            SELECT a.id AS analytics_id, COALESCE(dr.rate, :default_rate) AS rate
+            FROM analytics a
+            LEFT JOIN dsp_rates dr
+                ON dr.dsp_id = a.dsp_id
+                AND a.date >= dr.effective_from
+                AND (dr.effective_to IS NULL OR a.date < dr.effective_to)
+            {where}
+        ) AS r
+        WHERE analytics.id = r.analytics_id
+    """), params)
+    refresh_rollups(session, start_date, end_date, dsp_ids=dsp_ids)
+    bump_data_generation(session)
+    return result.rowcount
 
 
 def init_database():
-    """Inicializa o banco de dados com dados padrão"""
+    """
+    Inicializa o banco de dados com dados padrão
+    
+    O bootstrap do esquema roda uma vez por processo; o artista AllMark é
+    buscado a cada chamada (uma consulta), para refletir um banco recriado
+    por outro processo (clean_database.py --reset).
+    """
     session = get_session()
     
     try:
@@ -139,7 +857,7 @@ def init_database():
             print(f"Artista AllMark criado com ID: {artist.id}")
         else:
             print(f"Artista AllMark já existe com ID: {artist.id}")
-            
+        
         return artist
         
     except Exception as e:
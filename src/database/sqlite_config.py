@@ -0,0 +1,18 @@
+"""
+PRAGMAs SQLite compartilhados pelos dois bancos (modelos e Database)
+
+Módulo sem efeitos colaterais: importá-lo não cria diretórios nem arquivos.
+"""
+import os
+
+# PRAGMAs aplicados a cada conexão SQLite nova, nos dois bancos (configuráveis por
+# variável de ambiente). WAL permite que o dashboard leia enquanto uma importação
+# longa escreve.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', '-65536')),  # negativo = KiB (64 MiB)
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+    'temp_store': os.getenv('SQLITE_TEMP_STORE', 'MEMORY'),
+}
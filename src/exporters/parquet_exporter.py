@@ -0,0 +1,329 @@
+"""
+Exportação do banco de analytics para Parquet
+
+Os analytics são gravados particionados por artista e mês
+(analytics/artist_id=<id>/month=<AAAA-MM>/part-0.parquet), com a coluna de
+DSP codificada como dicionário. No modo incremental a geração dos dados
+(data_generation) é comparada com a do manifesto gravado junto aos arquivos:
+se nada foi gravado em analytics desde a última exportação, partições e
+rollups não são lidos nem regravados. Caso contrário, apenas as partições
+novas ou alteradas são reescritas, comparando uma assinatura do conteúdo de
+cada partição (soma dos hashes das linhas) com o manifesto. As tabelas de
+catálogo, que não mudam a geração, são regravadas só quando a assinatura
+delas muda.
+
+Requer o pacote opcional pyarrow.
+
+Uso:
+    python -m src.exporters.parquet_exporter data/exports/parquet
+"""
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+
+import pandas as pd
+from sqlalchemy import func, select
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Adiciona o diretório pai ao path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database.models import (
+    get_session, get_data_generation,
+    Album, Analytics, AnalyticsRollup, Artist, DSP, Track
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTPUT_DIR = "data/exports/parquet"
+MANIFEST_FILE = "_manifest.json"
+COMPRESSION = "zstd"
+SIGNATURE_CHUNK_SIZE = 100000
+
+# Tabelas de catálogo exportadas inteiras
+CATALOG_MODELS = {
+    'artists': Artist,
+    'albums': Album,
+    'tracks': Track,
+    'dsps': DSP,
+}
+
+
+class ParquetExporter:
+    """Exporta analytics, rollups e catálogo para arquivos Parquet"""
+    
+    def __init__(self, output_dir: str = DEFAULT_OUTPUT_DIR):
+        """
+        Args:
+            output_dir: Diretório raiz da exportação
+        """
+        self.output_dir = Path(output_dir)
+        self.session = get_session()
+    
+    def export(self, incremental: bool = True) -> Dict:
+        """
+        Exporta o banco para Parquet
+        
+        Args:
+            incremental: Reescreve apenas partições novas ou alteradas
+        
+        Returns:
+            Dicionário com o resultado da exportação
+        """
+        if not HAS_PYARROW:
+            return {
+                'status': 'error',
+                'message': 'Exportação Parquet requer o pacote pyarrow (pip install pyarrow)'
+            }
+        
+        try:
+            analytics_dir = self.output_dir / "analytics"
+            manifest = self._load_manifest() if incremental else {}
+            if not incremental and analytics_dir.exists():
+                shutil.rmtree(analytics_dir)
+            
+            # Lida antes dos dados: uma gravação durante a exportação deixa o
+            # manifesto com a geração antiga e a próxima execução compara de novo
+            generation = get_data_generation(self.session)
+            known = manifest.get('partitions', {})
+            
+            rows_written = 0
+            if manifest.get('generation') == generation:
+                # Nada foi gravado em analytics desde a última exportação
+                current, changed, removed = known, [], []
+                rollup_rows = manifest.get('rollup_rows', 0)
+            else:
+                current = self._partition_signatures()
+                changed = [key for key, signature in current.items() if known.get(key) != signature]
+                removed = [key for key in known if key not in current]
+                
+                for key in changed:
+                    artist_id, month = key.split('/')
+                    rows_written += self._write_analytics_partition(int(artist_id), month)
+                for key in removed:
+                    artist_id, month = key.split('/')
+                    shutil.rmtree(self._partition_dir(int(artist_id), month), ignore_errors=True)
+                
+                rollup_rows = self._write_rollups()
+            
+            known_catalog = manifest.get('catalog', {})
+            catalog, catalog_signatures = {}, {}
+            for name, model in CATALOG_MODELS.items():
+                catalog[name], catalog_signatures[name] = self._write_catalog_table(
+                    name, model, known_catalog.get(name)
+                )
+            
+            self._save_manifest({
+                'generation': generation,
+                'exported_at': datetime.utcnow().isoformat(),
+                'rollup_rows': rollup_rows,
+                'partitions': current,
+                'catalog': catalog_signatures
+            })
+            
+            logger.info(f"Exportação Parquet: {len(changed)} partições gravadas, {rows_written} registros")
+            return {
+                'status': 'success',
+                'output_dir': str(self.output_dir),
+                'partitions_written': len(changed),
+                'partitions_unchanged': len(current) - len(changed),
+                'partitions_removed': len(removed),
+                'rows_written': rows_written,
+                'rollup_rows': rollup_rows,
+                'catalog': catalog
+            }
+        
+        except Exception as e:
+            logger.error(f"Erro na exportação Parquet: {e}")
+            return {
+                'status': 'error',
+                'message': str(e)
+            }
+        finally:
+            self.session.close()
+    
+    def _partition_signatures(self) -> Dict[str, list]:
+        """
+        Calcula a assinatura do conteúdo de cada partição artista/mês
+        
+        Cada linha exportada recebe um hash de todas as suas colunas; a
+        assinatura é a quantidade de linhas e a soma (módulo 2^64) dos hashes.
+        Qualquer alteração em uma linha muda a assinatura, mesmo que os totais
+        do mês continuem iguais.
+        
+        Returns:
+            Dicionário "artist_id/AAAA-MM" -> [linhas, soma dos hashes em hexadecimal]
+        """
+        stmt = select(
+            Analytics.artist_id,
+            func.strftime('%Y-%m', Analytics.date).label('month'),
+            Analytics.date,
+            DSP.name.label('dsp'),
+            Analytics.dsp_id,
+            Analytics.track_id,
+            Analytics.streams,
+            Analytics.revenue,
+            Analytics.territory
+        ).join(DSP, Analytics.dsp_id == DSP.id)
+        
+        totals = {}
+        for chunk in pd.read_sql(stmt, self.session.connection(), chunksize=SIGNATURE_CHUNK_SIZE):
+            keys = (chunk['artist_id'].astype(str) + '/' + chunk['month']).to_numpy()
+            row_hash = pd.util.hash_pandas_object(chunk.drop(columns=['artist_id', 'month']), index=False)
+            grouped = row_hash.groupby(keys).agg(['size', 'sum'])
+            for key, size, hash_sum in grouped.itertuples():
+                count, total = totals.get(key, (0, 0))
+                totals[key] = (count + int(size), (total + int(hash_sum)) % 2 ** 64)
+        
+        return {key: [count, f"{total:016x}"] for key, (count, total) in totals.items()}
+    
+    def _partition_dir(self, artist_id: int, month: str) -> Path:
+        """Diretório de uma partição no layout Hive"""
+        return self.output_dir / "analytics" / f"artist_id={artist_id}" / f"month={month}"
+    
+    def _write_analytics_partition(self, artist_id: int, month: str) -> int:
+        """
+        Grava os analytics de um artista em um mês
+        
+        Args:
+            artist_id: ID do artista
+            month: Mês no formato AAAA-MM
+        
+        Returns:
+            Quantidade de registros gravados
+        """
+        start = date.fromisoformat(f"{month}-01")
+        end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+        
+        stmt = select(
+            Analytics.date,
+            DSP.name.label('dsp'),
+            Analytics.dsp_id,
+            Analytics.track_id,
+            Analytics.streams,
+            Analytics.revenue,
+            Analytics.territory
+        ).join(
+            DSP, Analytics.dsp_id == DSP.id
+        ).where(
+            Analytics.artist_id == artist_id,
+            Analytics.date >= start,
+            Analytics.date < end
+        ).order_by(Analytics.date, Analytics.dsp_id)
+        df = pd.read_sql(stmt, self.session.connection())
+        
+        # Colunas categóricas viram dicionário no Parquet
+        df['dsp'] = df['dsp'].astype('category')
+        df['territory'] = df['territory'].astype('category')
+        df['track_id'] = df['track_id'].astype('Int64')
+        
+        partition_dir = self._partition_dir(artist_id, month)
+        if partition_dir.exists():
+            shutil.rmtree(partition_dir)
+        partition_dir.mkdir(parents=True)
+        
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_table(table, partition_dir / "part-0.parquet", compression=COMPRESSION)
+        return len(df)
+    
+    def _write_rollups(self) -> int:
+        """Grava os rollups particionados por granularidade"""
+        stmt = select(
+            AnalyticsRollup.grain,
+            AnalyticsRollup.artist_id,
+            AnalyticsRollup.dsp_id,
+            DSP.name.label('dsp'),
+            AnalyticsRollup.period_start,
+            AnalyticsRollup.streams,
+            AnalyticsRollup.revenue,
+            AnalyticsRollup.days,
+            AnalyticsRollup.first_date,
+            AnalyticsRollup.last_date
+        ).join(DSP, AnalyticsRollup.dsp_id == DSP.id)
+        df = pd.read_sql(stmt, self.session.connection())
+        df['dsp'] = df['dsp'].astype('category')
+        
+        rollups_dir = self.output_dir / "rollups"
+        if rollups_dir.exists():
+            shutil.rmtree(rollups_dir)
+        for grain, group in df.groupby('grain'):
+            grain_dir = rollups_dir / f"grain={grain}"
+            grain_dir.mkdir(parents=True)
+            table = pa.Table.from_pandas(group.drop(columns='grain'), preserve_index=False)
+            pq.write_table(table, grain_dir / "part-0.parquet", compression=COMPRESSION)
+        return len(df)
+    
+    def _write_catalog_table(self, name: str, model, known_signature: Optional[list] = None) -> Tuple[int, list]:
+        """
+        Grava uma tabela de catálogo inteira em catalog/<nome>.parquet
+        
+        Args:
+            name: Nome do arquivo
+            model: Modelo da tabela
+            known_signature: Assinatura da última exportação; se for igual, o arquivo não é regravado
+        
+        Returns:
+            Tupla (quantidade de registros, assinatura [linhas, soma dos hashes em hexadecimal])
+        """
+        df = pd.read_sql(select(model.__table__), self.session.connection())
+        row_hash = pd.util.hash_pandas_object(df, index=False)
+        signature = [len(df), f"{int(row_hash.sum()) % 2 ** 64:016x}"]
+        
+        path = self.output_dir / "catalog" / f"{name}.parquet"
+        if signature != known_signature or not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            pq.write_table(table, path, compression=COMPRESSION)
+        return len(df), signature
+    
+    def _load_manifest(self) -> Dict:
+        """Lê o manifesto da última exportação"""
+        manifest_path = self.output_dir / MANIFEST_FILE
+        if not manifest_path.exists():
+            return {}
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    
+    def _save_manifest(self, manifest: Dict):
+        """Grava o manifesto da exportação"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.output_dir / MANIFEST_FILE, 'w') as f:
+            json.dump(manifest, f, indent=4)
+
+
+def main():
+    """Ponto de entrada da linha de comando"""
+    parser = argparse.ArgumentParser(description="Exporta analytics, rollups e catálogo para Parquet")
+    parser.add_argument("output", nargs="?", default=DEFAULT_OUTPUT_DIR, help="Diretório de saída")
+    parser.add_argument("--full", action="store_true", help="Regrava todas as partições")
+    args = parser.parse_args()
+    
+    result = ParquetExporter(args.output).export(incremental=not args.full)
+    
+    if result['status'] != 'success':
+        print(f"❌ {result['message']}")
+        return
+    print(f"\n✅ Exportação concluída em {result['output_dir']}")
+    print(f"   - Partições gravadas: {result['partitions_written']}")
+    print(f"   - Partições inalteradas: {result['partitions_unchanged']}")
+    print(f"   - Partições removidas: {result['partitions_removed']}")
+    print(f"   - Registros de analytics: {result['rows_written']}")
+    print(f"   - Registros de rollups: {result['rollup_rows']}")
+    for name, rows in result['catalog'].items():
+        print(f"   - {name}: {rows}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Testes da importação de CSVs de analytics em lote e em blocos
+"""
+from datetime import date
+from pathlib import Path
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.database import models
+from src.csv_processors.analytics_processor import AnalyticsCSVProcessor, build_date_index
+
+
+# Variantes do mesmo DSP em linhas distantes, para caírem em blocos diferentes
+CSV_ROWS = [
+    ["Deezer_30", 124, 132, 127],
+    ["Spotify", 5000, 5100, 0],
+    ["Apple Music_30", 1486, 1438, 1345],
+    ["Apple Music", 4253, 3961, 4025],
+    ["Deezer", 12757, 11948, 12319],
+    ["YouTube Content ID", 300, "", 310],
+    ["YouTube", 900, 950, 980],
+]
+
+
+@pytest.fixture
+def analytics_csv(tmp_path):
+    """CSV de exportação com variantes de DSP"""
+    filepath = tmp_path / "Analytics-Streams-by-Dsp-1-2025-09-16.csv"
+    pd.DataFrame(CSV_ROWS, columns=["DSP", "1 set", "2 set", "3 set"]).to_csv(filepath, index=False)
+    return filepath
+
+
+@pytest.fixture
+def use_database(tmp_path, monkeypatch):
+    """Aponta os modelos para um banco SQLite temporário, restaurando o original no fim"""
+    monkeypatch.chdir(tmp_path)
+    original_url = models.DATABASE_URL
+    
+    def configure(name: str):
+        models.configure_database(f"sqlite:///{tmp_path / name}")
+    
+    yield configure
+    models.configure_database(original_url)
+
+
+def stored_analytics():
+    """Retorna (DSP, data, streams, receita) gravados, ordenados"""
+    session = models.get_session()
+    try:
+        rows = session.query(
+            models.DSP.name, models.Analytics.date, models.Analytics.streams, models.Analytics.revenue
+        ).join(models.DSP, models.Analytics.dsp_id == models.DSP.id).order_by(
+            models.DSP.name, models.Analytics.date
+        ).all()
+        return [tuple(row) for row in rows]
+    finally:
+        session.close()
+
+
+def test_streaming_matches_bulk_import(analytics_csv, use_database):
+    use_database("bulk.db")
+    bulk = AnalyticsCSVProcessor().process_analytics_csv(str(analytics_csv))
+    bulk_rows = stored_analytics()
+    
+    use_database("streaming.db")
+    streaming = AnalyticsCSVProcessor().process_analytics_csv_streaming(
+        str(analytics_csv), chunksize=1, commit_every=2
+    )
+    streaming_rows = stored_analytics()
+    
+    assert bulk['status'] == streaming['status'] == 'success'
+    assert streaming_rows == bulk_rows
+    assert streaming['total_streams'] == bulk['total_streams'] == sum(row[2] for row in bulk_rows)
+    
+    deezer = {row[1].isoformat(): row[2] for row in bulk_rows if row[0] == 'Deezer'}
+    assert deezer['2025-09-01'] == 12757 + 124
+
+
+def test_file_without_date_columns_is_not_completed(tmp_path, use_database):
+    use_database("ranges.db")
+    filepath = tmp_path / "ranges.csv"
+    pd.DataFrame([["Spotify", 10]], columns=["DSP", "16 jun - 22 jun 2025"]).to_csv(filepath, index=False)
+    
+    result = AnalyticsCSVProcessor().process_analytics_csv(str(filepath))
+    
+    assert result['status'] == 'error'
+    session = models.get_session()
+    try:
+        assert [row.status for row in session.query(models.CSVImport)] == ['error']
+    finally:
+        session.close()
+
+
+def test_reimport_with_another_year_is_not_duplicate(analytics_csv, use_database):
+    use_database("years.db")
+    
+    first = AnalyticsCSVProcessor().process_analytics_csv(str(analytics_csv), year=2025)
+    again = AnalyticsCSVProcessor().process_analytics_csv(str(analytics_csv), year=2025)
+    corrected = AnalyticsCSVProcessor().process_analytics_csv(str(analytics_csv), year=2024)
+    
+    assert first['status'] == corrected['status'] == 'success'
+    assert again['status'] == 'duplicate'
+    assert {row[1].year for row in stored_analytics()} == {2024, 2025}
+
+
+def test_inferred_year_keeps_leap_day():
+    date_index = build_date_index(["28 fev", "29 fev", "1 mar"], reference_date=date(2025, 3, 5))
+    
+    assert date_index["29 fev"] == date(2024, 2, 29)
+    assert date_index["1 mar"] == date(2024, 3, 1)
+
+
+def test_streaming_missing_file_returns_error(tmp_path, use_database):
+    use_database("missing.db")
+    
+    result = AnalyticsCSVProcessor().process_analytics_csv_streaming(str(tmp_path / "missing.csv"))
+    
+    assert result['status'] == 'error'
+    assert result['rows_committed'] == 0
@@ -0,0 +1,106 @@
+"""
+Testes do banco de músicas e logs (src/database.py)
+"""
+from datetime import datetime, timedelta
+from pathlib import Path
+import importlib.util
+
+import pytest
+
+# src/database.py fica encoberto pelo pacote src/database/, então é carregado pelo caminho
+DATABASE_MODULE = Path(__file__).resolve().parent.parent / "src" / "database.py"
+spec = importlib.util.spec_from_file_location("legacy_database", DATABASE_MODULE)
+legacy_database = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(legacy_database)
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Banco vazio em um arquivo temporário"""
+    database = legacy_database.Database(str(tmp_path / "database.db"))
+    yield database
+    database.close()
+
+
+def make_track(isrc: str, title: str, artist: str = "AllMark") -> dict:
+    """Música no formato recebido por save_tracks"""
+    return {'isrc': isrc, 'title': title, 'artist': artist, 'album': "Primeiro Álbum"}
+
+
+def days_ago(days: int, hours: int = 0) -> str:
+    """Instante em UTC no formato de CURRENT_TIMESTAMP"""
+    return (datetime.utcnow() - timedelta(days=days, hours=hours)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def test_save_tracks_keeps_id_and_created_at_on_isrc_conflict(db):
+    db.save_tracks([make_track("BRAAA2500001", "Canção")], "fuga")
+    conn = db._connection()
+    conn.execute("UPDATE tracks SET created_at = '2024-01-01 00:00:00'")
+    conn.commit()
+    before = conn.execute("SELECT id, created_at FROM tracks").fetchall()
+    
+    saved = db.save_tracks([make_track("BRAAA2500001", "Canção (Remaster)")], "orchard")
+    
+    assert saved == 1
+    assert conn.execute("SELECT id, created_at FROM tracks").fetchall() == before
+    assert conn.execute("SELECT title, distributor FROM tracks").fetchall() == [("Canção (Remaster)", "orchard")]
+
+
+def test_tracks_page_chains_through_same_created_at(db):
+    db.save_tracks([make_track(f"BRAAA25{i:05d}", f"Faixa {i}") for i in range(7)], "fuga")
+    conn = db._connection()
+    conn.execute("UPDATE tracks SET created_at = '2025-01-01 00:00:00'")
+    conn.commit()
+    
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = db.get_tracks_page(limit=3, after=cursor, columns=['isrc'])
+        seen.extend(row['isrc'] for row in rows)
+        if cursor is None:
+            break
+    
+    assert sorted(seen) == [f"BRAAA25{i:05d}" for i in range(7)]
+    assert len(seen) == len(set(seen))
+
+
+def test_search_sees_title_change_after_upsert(db):
+    db.save_tracks([make_track("BRAAA2500001", "Madrugada")], "fuga")
+    assert [row['isrc'] for row in db.search_tracks("madrugada")] == ["BRAAA2500001"]
+    
+    db.save_tracks([make_track("BRAAA2500001", "Amanhecer")], "fuga")
+    
+    assert db.search_tracks("madrugada") == []
+    assert [row['isrc'] for row in db.search_tracks("amanhe")] == ["BRAAA2500001"]
+
+
+def test_retention_keeps_stats_and_bucket_percentiles(db):
+    with db.transaction() as conn:
+        for i in range(20):
+            created_at = days_ago(10, hours=i % 2)
+            conn.execute(legacy_database.INSERT_API_LOG_SQL,
+                         ('fuga', '/releases', 'GET', 500 if i % 5 == 0 else 200, i * 10, None, created_at))
+        conn.execute(legacy_database.INSERT_API_LOG_SQL,
+                     ('fuga', '/releases', 'GET', 200, 40, None, days_ago(0)))
+        for started_at, processed, success in ((days_ago(10), 100, 90), (days_ago(2), 50, 50)):
+            conn.execute('''
+                INSERT INTO sync_history
+                (distributor, sync_type, source, status, records_processed, records_success, started_at)
+                VALUES ('fuga', 'full', 'api', 'success', ?, ?, ?)
+            ''', (processed, success, started_at))
+    stats_before = db.get_api_log_stats(hours=24 * 30)
+    statistics_before = db.get_statistics()
+    
+    result = db.apply_retention(api_log_days=7, sync_days=5, batch_size=3)
+    
+    assert result['status'] == 'success'
+    assert result['api_logs_purged'] == 20
+    assert result['sync_history_purged'] == 1
+    assert db.get_api_log_stats(hours=24 * 30) == stats_before
+    assert db.get_statistics() == statistics_before
+    
+    # Percentis calculados sobre o balde inteiro, não sobre cada lote apagado
+    rollups = db._connection().execute(
+        "SELECT calls, latency_p50, latency_p95, latency_p99 FROM api_log_rollups"
+    ).fetchall()
+    assert sorted(rollups) == [(10, 80.0, 180.0, 180.0), (10, 90.0, 190.0, 190.0)]